@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import filecmp
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from argparse import ArgumentParser
+from prettytable import PrettyTable
+
+# Puts the toolkit on the module path.
+import bench_gauge  # noqa: F401
+import qa_toolkit
+
+
+# Writes the metrics file of a synthetic module the way spm.py does, with the dependency lists of every package.
+def generate_metrics(path, packages, seed):
+    rnd = random.Random(seed)
+    names = ["pkg/p%d/sub%d" % (p // 10, p) for p in range(packages)]
+    metrics = {}
+    for name in names:
+        efferent = sorted(rnd.sample(names, 8))
+        afferent = sorted(rnd.sample(names, rnd.randint(0, 12)))
+        external = ["github.com/pkg/errors", "k8s.io/api/core/v1"]
+        metrics[name] = {"efferent": len(efferent), "afferent": len(afferent), "external": len(external),
+                         "instability": 0.5, "efferent_packages": efferent, "afferent_packages": afferent,
+                         "external_packages": external}
+    with open(path, "w") as metrics_file:
+        json.dump(dict(sorted(metrics.items())), metrics_file, indent=4)
+
+    return path
+
+
+# The comparison before the streaming parser: both files are loaded and sorted in memory, kept as the reference.
+def compare_reference(compare, base_path, target_path, out):
+    with open(base_path, "r") as base_file:
+        base = json.load(base_file)
+    with open(target_path, "r") as target_file:
+        target = json.load(target_file)
+
+    return compare.compare(iter(sorted(base.items())), iter(sorted(target.items())), compare.JsonWriter(out))
+
+
+# Returns the time and the peak of the memory allocated by the function.
+def measure_memory(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+if "__main__" == __name__:
+    parser = ArgumentParser()
+    parser.add_argument("--packages", dest="packages", type=int, nargs="+", default=[1000, 5000, 20000],
+                        help="The numbers of packages to compare the metrics of")
+    args = parser.parse_args()
+
+    compare = qa_toolkit.load("compare")
+    directory = tempfile.mkdtemp()
+    table = PrettyTable(("Packages", "File size, MB", "Parser", "Time, s", "Peak memory, MB"))
+    try:
+        for packages in args.packages:
+            base = generate_metrics(os.path.join(directory, "base.json"), packages, 1)
+            target = generate_metrics(os.path.join(directory, "target.json"), packages, 2)
+            size = os.path.getsize(target) / 2 ** 20
+            outputs = [os.path.join(directory, "reference.json"), os.path.join(directory, "streaming.json")]
+            comparisons = (
+                ("json.load", lambda out: compare_reference(compare, base, target, out)),
+                ("streaming", lambda out: compare.compare(compare.sorted_metrics(base), compare.sorted_metrics(target),
+                                                          compare.JsonWriter(out))),
+            )
+            for output, (name, fn) in zip(outputs, comparisons):
+                with open(output, "w") as out:
+                    elapsed, peak = measure_memory(lambda: fn(out))
+                table.add_row((packages, "%.1f" % size, name, "%.2f" % elapsed, "%.1f" % (peak / 2 ** 20)))
+            if not filecmp.cmp(outputs[0], outputs[1], shallow=False):
+                raise AssertionError("The parsers produced different comparisons")
+    finally:
+        shutil.rmtree(directory)
+
+    for column in ("Packages", "File size, MB", "Time, s", "Peak memory, MB"):
+        table.align[column] = "r"
+    print(table)
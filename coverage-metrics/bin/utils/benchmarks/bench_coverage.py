@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from prettytable import PrettyTable
+
+# Puts the toolkit on the module path.
+import bench_gauge  # noqa: F401
+import qa_toolkit
+
+PATH_FIXTURE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "testdata", "coverage-guard")
+PATH_EXPECTED = os.path.join(PATH_FIXTURE, "expected.json")
+MODULE = "example.com/guard"
+
+
+# Copies the fixture module to the path and commits it, then applies the changes of the case on top of it uncommitted,
+# the way they are in a working tree before a PR.
+def prepare_case(path, case):
+    shutil.copytree(os.path.join(PATH_FIXTURE, "module"), path)
+    for command in (["init", "--quiet"], ["add", "."], ["commit", "--quiet", "-m", "base"]):
+        subprocess.run(["git", "-c", "user.name=bench", "-c", "user.email=bench@example.com"] + command, cwd=path,
+                       check=True)
+    # The changes are copied without their times: a changed file of the same size and time looks unchanged to git.
+    shutil.copytree(os.path.join(PATH_FIXTURE, "changes", case), path, copy_function=shutil.copy, dirs_exist_ok=True)
+
+
+# Returns the coverage of the changed files in the changed lines report of the guard, the totals left out.
+def changed_files(output):
+    files = {}
+    for line in output.split("\n"):
+        cells = [cell.strip() for cell in line.strip("|").split("|")]
+        if len(cells) == 5 and cells[0].endswith(".go"):
+            files[cells[0]] = cells[3]
+
+    return files
+
+
+if "__main__" == __name__:
+    parser = ArgumentParser()
+    parser.add_argument("--verbose", dest="verbose", action="store_true", help="Prints the output of the guard")
+    args = parser.parse_args()
+
+    with open(PATH_EXPECTED, "r") as expected_file:
+        expected = json.load(expected_file)
+
+    table = PrettyTable(("Case", "Exit code", "Changed files", "Time, s"))
+    failures = []
+    directory = tempfile.mkdtemp()
+    try:
+        for case, outcome in sorted(expected.items()):
+            path = os.path.join(directory, case)
+            prepare_case(path, case)
+            out = io.StringIO()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(out):
+                code = qa_toolkit.run("coverage", ["-r", path, "-m", MODULE, "--base-ref", "HEAD"])
+            elapsed = time.perf_counter() - started
+            if args.verbose:
+                print(out.getvalue())
+
+            files = changed_files(out.getvalue())
+            if code != outcome["exit"]:
+                failures.append("%s exited with %d instead of %d" % (case, code, outcome["exit"]))
+            if files != outcome["files"]:
+                failures.append("%s reported the changed files %s instead of %s" % (case, files, outcome["files"]))
+            table.add_row((case, code, ", ".join("%s %s" % f for f in sorted(files.items())), "%.2f" % elapsed))
+    finally:
+        shutil.rmtree(directory)
+
+    table.align["Case"] = "l"
+    table.align["Changed files"] = "l"
+    table.align["Time, s"] = "r"
+    print(table)
+    if failures:
+        raise AssertionError("The coverage guard failed the fixture: %s" % "; ".join(failures))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+from git import Repo
+from prettytable import PrettyTable
+
+# The tools are loaded through the toolkit package, which is next to the tool directories; the other benchmarks import
+# it once this module has put it on the module path.
+PATH_UTILS = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if PATH_UTILS not in sys.path:
+    sys.path.insert(0, PATH_UTILS)
+import qa_toolkit  # noqa: E402
+
+
+# Runs the function a number of times and returns the best wall time with the last result.
+def measure(fn, rounds):
+    best = None
+    result = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, result
+
+
+if "__main__" == __name__:
+    parser = ArgumentParser()
+    parser.add_argument("--repo-path", dest="repo_path", required=True, help="A path to a local git repository")
+    parser.add_argument("--days", dest="days", type=int, default=30, help="A number of days for the report")
+    parser.add_argument("--rounds", dest="rounds", type=int, default=3, help="A number of rounds per engine")
+    args = parser.parse_args()
+
+    gauge_module = qa_toolkit.load("gauge")
+    repo = Repo(args.repo_path)
+    classifier = gauge_module.PathClassifier({"integration": "tests/integration", "e2e": "tests/e2e"})
+
+    results = {}
+    table = PrettyTable(("Engine", "Commits", "Best time, s", "Speedup"))
+    for engine, collect in ((gauge_module.ENGINE_STATS, gauge_module.collect_commits_stats),
+                            (gauge_module.ENGINE_LOG, gauge_module.collect_commits)):
+        elapsed, gauged = measure(lambda: list(gauge_module.gauge(collect(repo, args.days), classifier)), args.rounds)
+        results[engine] = (elapsed, gauged)
+
+    if results[gauge_module.ENGINE_STATS][1] != results[gauge_module.ENGINE_LOG][1]:
+        raise AssertionError("The engines produced different gauged commits")
+
+    baseline = results[gauge_module.ENGINE_STATS][0]
+    for engine, (elapsed, gauged) in results.items():
+        table.add_row((engine, len(gauged), "%.3f" % elapsed, "%.1fx" % (baseline / elapsed)))
+
+    table.align["Engine"] = "l"
+    table.align["Commits"] = "r"
+    table.align["Best time, s"] = "r"
+    table.align["Speedup"] = "r"
+    print(table)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from prettytable import PrettyTable
+
+# Puts the toolkit on the module path.
+import bench_gauge  # noqa: F401
+import qa_toolkit
+
+GLOSSARY = "| Term | Description |\n|------|-------------|\n| %s | the first term |\n| %s | the second term |\n"
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+MAX_AGE = 60
+
+
+# The glossary server stand-in: serves the current glossary with its ETag, its modification time and a max-age,
+# answers a request revalidating the current ETag with "Not Modified", and fails the number of requests set with
+# "Service Unavailable" first. The headers of every request are recorded.
+class GlossaryHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if server.failures > 0:
+            server.failures -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        etag, terms = server.glossary
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "max-age=%d" % MAX_AGE)
+            self.end_headers()
+            return
+
+        body = (GLOSSARY % terms).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/markdown; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.send_header("Cache-Control", "max-age=%d" % MAX_AGE)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# Starts the glossary server stand-in on a free local port in a background thread.
+def start_server(glossary):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GlossaryHandler)
+    server.glossary = glossary
+    server.failures = 0
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Makes the cached glossary stale, as if its max-age expired.
+def expire(path):
+    with open(path, "r") as cache_file:
+        cache = json.load(cache_file)
+    cache["expires"] = time.time() - 1
+    with open(path, "w") as cache_file:
+        json.dump(cache, cache_file)
+
+
+# Reads the cached glossary, or None if it is missing.
+def read_cache(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as cache_file:
+        return json.load(cache_file)
+
+
+if "__main__" == __name__:
+    parser = ArgumentParser()
+    parser.add_argument("--retries", dest="retries", type=int, default=2, help="A number of retries per download")
+    args = parser.parse_args()
+
+    highlighter = qa_toolkit.load("highlight")
+    # The backoff is shortened, the retries are still made in the same order.
+    highlighter.RETRY_DELAY = 0.01
+    server = start_server(('"v1"', ("Module", "Kyma")))
+    url = "http://127.0.0.1:%d/glossary.md" % server.server_address[1]
+    directory = tempfile.mkdtemp()
+    cache_path = os.path.join(directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+
+    def changed():
+        expire(cache_path)
+        server.glossary = ('"v2"', ("Module", "Runtime"))
+        server.failures = 1
+
+    # Every step: the name, the preparation, the expected terms or exception, and the check of the requests the server
+    # got, of the cache and of the standard error afterwards.
+    steps = (
+        ("download", lambda: None, ["Module", "Kyma"],
+         lambda requests, cache, errors: len(requests) == 1 and "If-None-Match" not in requests[0]
+         and cache["etag"] == '"v1"' and cache["last_modified"] == LAST_MODIFIED
+         and cache["expires"] > time.time() + MAX_AGE / 2),
+        ("fresh cache", lambda: None, ["Module", "Kyma"],
+         lambda requests, cache, errors: len(requests) == 0),
+        ("revalidation, 304", lambda: expire(cache_path), ["Module", "Kyma"],
+         lambda requests, cache, errors: len(requests) == 1 and requests[0].get("If-None-Match") == '"v1"'
+         and requests[0].get("If-Modified-Since") == LAST_MODIFIED and cache["etag"] == '"v1"'
+         and cache["expires"] > time.time() + MAX_AGE / 2),
+        ("changed, 503 retried", changed, ["Module", "Runtime"],
+         lambda requests, cache, errors: len(requests) == 2 and cache["etag"] == '"v2"'
+         and cache["terms"] == ["Module", "Runtime"]),
+        ("offline, stale cache", lambda: (expire(cache_path), stop()), ["Module", "Runtime"],
+         lambda requests, cache, errors: cache["etag"] == '"v2"' and cache["terms"] == ["Module", "Runtime"]
+         and "the cached one is used" in errors),
+        ("offline, no cache", lambda: os.remove(cache_path), OSError,
+         lambda requests, cache, errors: cache is None),
+    )
+
+    table = PrettyTable(("Step", "Requests", "Terms", "Time, s", "Result"))
+    failures = []
+    try:
+        for name, prepare, expected, check in steps:
+            prepare()
+            first_request = len(server.requests)
+            errors = io.StringIO()
+            started = time.perf_counter()
+            try:
+                with contextlib.redirect_stderr(errors):
+                    terms = highlighter.read_keywords(url, directory, timeout=2, retries=args.retries)
+            except OSError as e:
+                terms = type(e)
+            elapsed = time.perf_counter() - started
+
+            requests = server.requests[first_request:]
+            if isinstance(expected, type):
+                is_expected = isinstance(terms, type) and issubclass(terms, expected)
+            else:
+                is_expected = terms == expected
+            is_expected = is_expected and check(requests, read_cache(cache_path), errors.getvalue())
+            if not is_expected:
+                failures.append(name)
+            table.add_row((name, len(requests), terms.__name__ if isinstance(terms, type) else ", ".join(terms),
+                           "%.3f" % elapsed, "ok" if is_expected else "wrong"))
+    finally:
+        shutil.rmtree(directory)
+
+    table.align["Step"] = "l"
+    table.align["Terms"] = "l"
+    table.align["Time, s"] = "r"
+    print(table)
+    if failures:
+        raise AssertionError("The glossary download failed the steps: %s" % ", ".join(failures))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+import io
+import random
+
+from argparse import ArgumentParser
+from prettytable import PrettyTable
+
+from bench_gauge import measure
+from bench_spm import MODULE
+import qa_toolkit
+
+
+# Generates the imports of a synthetic module: the packages import mostly the packages numbered lower (a layered
+# architecture), and a share of the imports goes the other way round and closes cycles.
+def generate_imports(packages, imports, back_share, seed=1):
+    rnd = random.Random(seed)
+    dependencies = {}
+    for p in range(packages):
+        targets = []
+        for _ in range(imports):
+            backward = p == 0 or rnd.random() < back_share
+            targets.append(rnd.randrange(packages) if backward else rnd.randrange(p))
+        dependencies["pkg/p%d" % p] = ["%s/pkg/p%d" % (MODULE, t) for t in targets] + ["fmt", "context"]
+
+    return dependencies
+
+
+# Returns the numbers of the transitively imported and importing packages found by a search from every package.
+def closure_sizes_reference(graph):
+    reached = []
+    for package in range(len(graph.names)):
+        seen = {package}
+        stack = [package]
+        while stack:
+            for i in graph.edges[stack.pop()]:
+                if i not in seen:
+                    seen.add(i)
+                    stack.append(i)
+        reached.append(seen)
+
+    afferent = [0] * len(graph.names)
+    for package, seen in enumerate(reached):
+        for i in seen:
+            afferent[i] += 1 if i != package else 0
+
+    return [len(seen) - 1 for seen in reached], afferent
+
+
+if "__main__" == __name__:
+    parser = ArgumentParser()
+    parser.add_argument("--packages", dest="packages", type=int, default=5000, help="A number of packages")
+    parser.add_argument("--imports", dest="imports", type=int, default=8, help="A number of imports per package")
+    parser.add_argument("--back-share", dest="back_share", type=float, default=0.001,
+                        help="A share of the imports of the packages numbered higher, which close cycles")
+    parser.add_argument("--verify", dest="verify", action="store_true",
+                        help="Verifies the transitive closure against a search from every package (quadratic)")
+    parser.add_argument("--rounds", dest="rounds", type=int, default=3, help="A number of rounds per operation")
+    args = parser.parse_args()
+
+    spm = qa_toolkit.load("spm")
+    dependencies = generate_imports(args.packages, args.imports, args.back_share)
+    module = MODULE + "/"
+
+    elapsed, graph = measure(lambda: spm.PackageGraph(dependencies, module), args.rounds)
+    results = [("build the graph", elapsed)]
+    elapsed, components = measure(graph.components, args.rounds)
+    results.append(("strongly connected components", elapsed))
+    elapsed, cycles = measure(lambda: graph.cycles(components), args.rounds)
+    results.append(("cycles", elapsed))
+    elapsed, sizes = measure(lambda: graph.closure_sizes(components), args.rounds)
+    results.append(("transitive closure sizes", elapsed))
+    results.append(("DOT", measure(lambda: graph.write_dot(io.StringIO(), components), args.rounds)[0]))
+    results.append(("GraphML", measure(lambda: graph.write_graphml(io.StringIO(), components), args.rounds)[0]))
+
+    if args.verify and sizes != closure_sizes_reference(graph):
+        raise AssertionError("The transitive closure sizes differ from the reference")
+
+    table = PrettyTable(("Operation", "Best time, s"))
+    for name, elapsed in results:
+        table.add_row((name, "%.3f" % elapsed))
+    table.align["Operation"] = "l"
+    table.align["Best time, s"] = "r"
+    print(table)
+    print("%d packages, %d imports, %d cycles of %d packages." % (
+        len(graph.names), sum(len(e) for e in graph.edges), len(cycles), sum(len(c) for c in cycles)))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import random
+import re
+
+from argparse import ArgumentParser
+from prettytable import PrettyTable
+
+from bench_gauge import measure
+import qa_toolkit
+
+SYLLABLES = ("ka", "ly", "mo", "du", "le", "te", "pla", "run", "ti", "me", "con", "fig", "ser", "vi", "ce", "go", "ver")
+STEPS = ("Given", "When", "And", "Then")
+
+colour_regexp = re.compile(r"\x1b\[[0-9;]*m")
+
+
+# Generates the glossary terms: capitalised words and a share of the terms that extend another term with one more word
+# (e.g. "Module" and "ModuleTemplate").
+def generate_terms(terms, nested_share, rnd):
+    words = set()
+    while len(words) < terms:
+        words.add("".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))).capitalize())
+    words = sorted(words)
+
+    glossary = []
+    for word in words:
+        if glossary and rnd.random() < nested_share:
+            word = rnd.choice(glossary) + word
+        glossary.append(word)
+
+    return list(dict.fromkeys(glossary))
+
+
+# Generates a BDD report of the size in bytes, which mentions the glossary terms among the other words.
+def generate_report(size, terms, rnd):
+    lines = []
+    length = 0
+    while length < size:
+        words = [rnd.choice(terms) if rnd.random() < 0.2 else rnd.choice(SYLLABLES) for _ in range(rnd.randint(4, 12))]
+        line = "    %s %s" % (rnd.choice(STEPS), " ".join(words))
+        lines.append(line)
+        length += len(line) + 1
+
+    return "\n".join(lines)
+
+
+# The highlighting of highlighter.py before the single pass matcher: a replacement per keyword, kept as the reference.
+def highlight_keywords_reference(highlighter, text, kwds):
+    for keyword in kwds:
+        text = text.replace(keyword, highlighter.highlight(keyword, highlighter.COLOURS['cyan']))
+
+    return text
+
+
+if "__main__" == __name__:
+    parser = ArgumentParser()
+    parser.add_argument("--size", dest="size", type=int, default=10, help="A size of the report, MB")
+    parser.add_argument("--terms", dest="terms", type=int, default=300, help="A number of glossary terms")
+    parser.add_argument("--nested-share", dest="nested_share", type=float, default=0.1,
+                        help="A share of the terms which extend another term")
+    parser.add_argument("--rounds", dest="rounds", type=int, default=3, help="A number of rounds per matcher")
+    args = parser.parse_args()
+
+    highlighter = qa_toolkit.load("highlight")
+    rnd = random.Random(1)
+    terms = generate_terms(args.terms, args.nested_share, rnd)
+    report = generate_report(args.size * 2 ** 20, terms, rnd)
+
+    matchers = (
+        ("replace per keyword", lambda: highlight_keywords_reference(highlighter, report, terms)),
+        ("single pass", lambda: highlighter.highlight_keywords(report, terms)),
+    )
+    results = [(name,) + measure(highlight, args.rounds) for name, highlight in matchers]
+
+    highlighted = results[1][2]
+    if colour_regexp.sub("", highlighted) != report:
+        raise AssertionError("The single pass matcher changed the report text")
+    nested = any(a != b and a in b for a in terms for b in terms)
+    if not nested and highlighted != results[0][2]:
+        raise AssertionError("The matchers highlighted the terms differently")
+
+    table = PrettyTable(("Matcher", "Terms", "Highlighted", "Best time, s", "Speedup"))
+    for name, elapsed, result in results:
+        table.add_row((name, len(terms), result.count(highlighter.COLOURS["empty"]), "%.3f" % elapsed,
+                       "%.1fx" % (results[0][1] / elapsed)))
+
+    table.align["Matcher"] = "l"
+    for column in ("Terms", "Highlighted", "Best time, s", "Speedup"):
+        table.align[column] = "r"
+    print(table)
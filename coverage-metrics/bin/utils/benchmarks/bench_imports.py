@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from argparse import ArgumentParser
+from prettytable import PrettyTable
+
+from bench_gauge import measure
+from bench_spm import generate_module
+import qa_toolkit
+
+PATH_CORPUS = os.path.join(os.path.dirname(os.path.realpath(__file__)), "testdata", "go-imports")
+PATH_EXPECTED = os.path.join(PATH_CORPUS, "expected.json")
+
+# The regular expression of spm.py before the import tokenizer, kept as the reference.
+go_imports_regexp_reference = re.compile(r"import \((.*?)\)|import (\".*?\")", flags=re.MULTILINE | re.DOTALL)
+
+
+# The import extraction of spm.py before the import tokenizer, kept as the reference.
+def extract_deps_reference(file_contents):
+    imports_match = go_imports_regexp_reference.search(file_contents)
+    if not imports_match:
+        return []
+
+    raw_imports = imports_match.group(1) if imports_match.group(1) else imports_match.group(2)
+    imports = [i.strip() for i in raw_imports.split("\n")]
+    imports = [i for i in imports if len(i) > 0 and not i.startswith("//")]
+
+    return list(set(re.match(r'.*\"(.*)\".*', i)[1] for i in imports))
+
+
+# Returns the imports found by the reference, or None when it fails on the file (e.g. on an empty import group).
+def reference_deps(file_contents):
+    try:
+        return extract_deps_reference(file_contents)
+    except (AttributeError, TypeError):
+        return None
+
+
+# Checks both parsers against the expected imports and build constraints of the corpus of tricky go files.
+# Returns the table of the results per file and the number of the files the tokenizer got wrong.
+def verify_corpus(spm, context):
+    with open(PATH_EXPECTED, "r") as expected_file:
+        expected = json.load(expected_file)
+
+    table = PrettyTable(("File", "Reference", "Tokenizer", "Build constraint"))
+    failures = 0
+    for name, case in sorted(expected.items()):
+        with open(os.path.join(PATH_CORPUS, name), "r") as file:
+            text = file.read()
+        reference = reference_deps(text)
+        reference = reference is not None and sorted(reference) == case["imports"]
+
+        imports, build = spm.parse_go_file(text)
+        tokenizer = sorted(set(imports)) == case["imports"] and build == case["build"]
+        selected = context.matches(name, build) == case["linux_amd64"]
+        failures += 0 if tokenizer and selected else 1
+        table.add_row((name, "ok" if reference else "wrong", "ok" if tokenizer else "wrong",
+                       "ok" if selected else "wrong"))
+
+    table.align["File"] = "l"
+    return table, failures
+
+
+# Reads the headers of all non-test go files under the path.
+def read_headers(spm, path):
+    headers = []
+    for root, dirs, files in os.walk(path):
+        for f in spm.package_go_files(root, files):
+            headers.append(spm.read_header(f))
+
+    return headers
+
+
+if "__main__" == __name__:
+    parser = ArgumentParser()
+    parser.add_argument("--path", dest="path",
+                        help="A path to go sources to parse (defaults to a synthetic module)")
+    parser.add_argument("--packages", dest="packages", type=int, default=200, help="A number of synthetic packages")
+    parser.add_argument("--files", dest="files", type=int, default=8, help="A number of files per synthetic package")
+    parser.add_argument("--rounds", dest="rounds", type=int, default=5, help="A number of rounds per parser")
+    args = parser.parse_args()
+
+    spm = qa_toolkit.load("spm")
+    table, failures = verify_corpus(spm, spm.BuildContext("linux", "amd64"))
+    print(table)
+    if failures:
+        raise AssertionError("The tokenizer got %d files of the corpus wrong" % failures)
+
+    path = args.path or generate_module(tempfile.mkdtemp(), args.packages, args.files, 0)
+    try:
+        headers = read_headers(spm, path)
+    finally:
+        if not args.path:
+            shutil.rmtree(path)
+
+    parsers = (
+        ("reference", lambda: [reference_deps(header) for header in headers]),
+        ("tokenizer", lambda: [spm.extract_deps(header) for header in headers]),
+    )
+    results = [(name,) + measure(parse, args.rounds) for name, parse in parsers]
+
+    differences = sum(1 for a, b in zip(results[0][2], results[1][2]) if a is None or sorted(a) != sorted(b))
+    table = PrettyTable(("Parser", "Files", "Best time, s", "Speedup"))
+    for name, elapsed, _ in results:
+        table.add_row((name, len(headers), "%.3f" % elapsed, "%.1fx" % (results[0][1] / elapsed)))
+
+    table.align["Parser"] = "l"
+    table.align["Files"] = "r"
+    table.align["Best time, s"] = "r"
+    table.align["Speedup"] = "r"
+    print(table)
+    print("The parsers disagree on %d of %d files." % (differences, len(headers)))
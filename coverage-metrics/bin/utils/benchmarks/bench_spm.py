@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import os
+import random
+import shutil
+import tempfile
+
+from argparse import ArgumentParser
+from prettytable import PrettyTable
+
+from bench_gauge import measure
+import qa_toolkit
+
+MODULE = "github.com/kyma-project/synthetic"
+EXTERNAL_PACKAGES = ["github.com/pkg/errors", "k8s.io/api/core/v1", "sigs.k8s.io/controller-runtime/pkg/client"]
+STANDARD_PACKAGES = ["context", "errors", "fmt", "os", "strings", "time"]
+
+
+# Generates a synthetic go module with the number of packages and files per package.
+# Every file has an import block followed by a body of the given number of lines.
+def generate_module(path, packages, files, body_lines, seed=1):
+    rnd = random.Random(seed)
+    names = ["pkg/p%d/sub%d" % (p // 10, p) for p in range(packages)]
+    for name in names:
+        os.makedirs(os.path.join(path, name))
+        for f in range(files):
+            imports = rnd.sample(STANDARD_PACKAGES, 2) + rnd.sample(EXTERNAL_PACKAGES, 1)
+            imports += ["%s/%s" % (MODULE, n) for n in rnd.sample(names, min(3, len(names)))]
+            lines = ["package %s" % os.path.basename(name), "", "import ("]
+            lines += ['\t"%s"' % i for i in imports]
+            lines += [")", ""]
+            lines += ["func f%d_%d() string { return \"%d\" }" % (f, i, i) for i in range(body_lines)]
+            with open(os.path.join(path, name, "file%d.go" % f), "w") as file:
+                file.write("\n".join(lines) + "\n")
+
+    return path
+
+
+# The file scan of spm.py before the header-only parallel scanner, kept as the reference.
+def fetch_deps_reference(spm, path, skipped_dirs):
+    packages = {}
+    for root, dirs, files in os.walk(path):
+        package_name = spm.trim_prefix(root, path)
+        if any(True for to_skip in skipped_dirs if package_name.startswith(to_skip)):
+            continue
+
+        go_files = [f for f in files if not f.endswith(spm.GO_TEST_SUFFIX) and f.endswith(spm.GO_SUFFIX)]
+        if len(go_files) == 0:
+            continue
+
+        dependencies = []
+        for f in go_files:
+            with open(os.path.join(root, f), "r") as file:
+                dependencies += spm.extract_deps(file.read())
+        packages[package_name] = list(set(dependencies))
+
+    return packages
+
+
+def normalised(packages):
+    return {p: sorted(deps) for p, deps in packages.items()}
+
+
+if "__main__" == __name__:
+    parser = ArgumentParser()
+    parser.add_argument("--packages", dest="packages", type=int, default=500, help="A number of packages")
+    parser.add_argument("--files", dest="files", type=int, default=8, help="A number of files per package")
+    parser.add_argument("--lines", dest="lines", type=int, default=300, help="A number of body lines per file")
+    parser.add_argument("--jobs", dest="jobs", type=int, default=os.cpu_count(), help="A number of scan processes")
+    parser.add_argument("--rounds", dest="rounds", type=int, default=3, help="A number of rounds per scanner")
+    args = parser.parse_args()
+
+    spm = qa_toolkit.load("spm")
+    path = generate_module(tempfile.mkdtemp(), args.packages, args.files, args.lines) + "/"
+    skipped = list(spm.DIRS_TO_SKIP)
+
+    try:
+        scanners = (
+            ("reference", lambda: fetch_deps_reference(spm, path, skipped)),
+            ("header", lambda: spm.fetch_deps(path, skipped, 1)),
+            ("header, %d jobs" % args.jobs, lambda: spm.fetch_deps(path, skipped, args.jobs)),
+        )
+        results = [(name,) + measure(scanner, args.rounds) for name, scanner in scanners]
+    finally:
+        shutil.rmtree(path)
+
+    if any(normalised(packages) != normalised(results[0][2]) for _, _, packages in results):
+        raise AssertionError("The scanners discovered different dependencies")
+
+    table = PrettyTable(("Scanner", "Packages", "Best time, s", "Speedup"))
+    for name, elapsed, packages in results:
+        table.add_row((name, len(packages), "%.3f" % elapsed, "%.1fx" % (results[0][1] / elapsed)))
+
+    table.align["Scanner"] = "l"
+    table.align["Packages"] = "r"
+    table.align["Best time, s"] = "r"
+    table.align["Speedup"] = "r"
+    print(table)
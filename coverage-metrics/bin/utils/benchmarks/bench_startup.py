@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from argparse import ArgumentParser
+from prettytable import PrettyTable
+
+from bench_gauge import PATH_UTILS, measure
+from bench_spm import MODULE, generate_module
+
+PATH_TOOLKIT = os.path.join(os.path.dirname(PATH_UTILS), "qa-toolkit")
+# The tool scripts started with --help, so only the interpreter start and the imports are measured.
+SCRIPTS = (
+    ("spm", os.path.join(PATH_UTILS, "package-metrics", "spm.py")),
+    ("compare", os.path.join(PATH_UTILS, "package-metrics", "compare.py")),
+    ("coverage", os.path.join(PATH_UTILS, "unit-test-coverage", "coverage_guard.py")),
+    ("gauge", os.path.join(PATH_UTILS, "commit-test-suites", "gauge-sprint-commits.py")),
+    ("highlight", os.path.join(PATH_UTILS, "report-highlighter", "highlighter.py")),
+)
+# Runs the tool chain in a single interpreter through the toolkit library.
+IN_PROCESS_CHAIN = """
+import sys
+sys.path.insert(0, %r)
+import qa_toolkit
+for command, argv in %r:
+    qa_toolkit.run(command, argv)
+"""
+
+
+# Runs the command with its output discarded.
+def run_quietly(command):
+    subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+# Returns the commands of the chain calculating the metrics of the module twice and comparing them.
+def chain_commands(path):
+    base, target = os.path.join(path, "base.json"), os.path.join(path, "target.json")
+    return [
+        ("spm", ["-p", path, "-m", MODULE, "-o", base, "-j", "1"]),
+        ("spm", ["-p", path, "-m", MODULE, "-o", target, "-j", "1"]),
+        ("compare", ["-b", base, "-t", target]),
+    ]
+
+
+if "__main__" == __name__:
+    parser = ArgumentParser()
+    parser.add_argument("--packages", dest="packages", type=int, default=20,
+                        help="A number of packages of the synthetic module the tool chain runs on")
+    parser.add_argument("--rounds", dest="rounds", type=int, default=10, help="A number of rounds per command")
+    args = parser.parse_args()
+
+    python = sys.executable
+    table = PrettyTable(("Command", "Best time, s"))
+    startups = [
+        ("python", [python, "-c", "pass"]),
+        ("python, import git, prettytable, yaml", [python, "-c", "import git, prettytable, yaml"]),
+    ]
+    for command, script in SCRIPTS:
+        startups.append(("%s --help" % os.path.basename(script), [python, script, "--help"]))
+        startups.append(("qa-toolkit %s --help" % command, [python, PATH_TOOLKIT, command, "--help"]))
+    for name, command in startups:
+        table.add_row((name, "%.3f" % measure(lambda: run_quietly(command), args.rounds)[0]))
+
+    path = generate_module(tempfile.mkdtemp(), args.packages, 2, 10)
+    try:
+        chain = chain_commands(path)
+        spawned = [[python, PATH_TOOLKIT, command] + argv for command, argv in chain]
+        elapsed, _ = measure(lambda: [run_quietly(command) for command in spawned], args.rounds)
+        table.add_row(("spm, spm, compare: a process per tool", "%.3f" % elapsed))
+        in_process = [python, "-c", IN_PROCESS_CHAIN % (PATH_UTILS, chain)]
+        elapsed, _ = measure(lambda: run_quietly(in_process), args.rounds)
+        table.add_row(("spm, spm, compare: a single process", "%.3f" % elapsed))
+    finally:
+        shutil.rmtree(path)
+
+    table.align["Command"] = "l"
+    table.align["Best time, s"] = "r"
+    print(table)
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+import calendar
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from git import Repo
+from prettytable import PrettyTable
+
+from bench_compare import generate_metrics
+from bench_gauge import measure
+from bench_highlighter import generate_report, generate_terms
+from bench_spm import MODULE, generate_module
+import qa_toolkit
+
+PATH_BASELINE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "baseline.json")
+BASELINE_VERSION = 1
+# The regression of the best time over the baseline which fails the suite, %.
+TOLERANCE = 25
+# The synthetic commits are dated from a fixed day a minute apart, so their SHAs and the gauged output never change.
+GENESIS = calendar.timegm((2024, 1, 1, 0, 0, 0))
+AUTHORS = ("Ada Lovelace", "Alan Turing", "Grace Hopper", "Linus Torvalds")
+MESSAGES = ("feat(api): add the field %d", "fix(controller): handle the error %d", "chore(deps): bump the module %d",
+            "test: cover the case %d", "refactor: simplify the loop %d", "Merge pull request #%d from fork/branch",
+            "Update the docs %d")
+SUITES = {"integration": "tests/integration", "e2e": "tests/e2e"}
+# The numbers of the go files per package and of the coverage profile blocks per go file.
+PROFILE_FILES = 5
+PROFILE_BLOCKS = 40
+
+
+# Generates a git repository with the number of commits changing a few of the files each, half of them test files of
+# the unit, the integration and the E2E suites. The history is written by a single "git fast-import" run.
+def generate_repository(path, commits, files, seed=1):
+    rnd = random.Random(seed)
+    directories = ["pkg/p%d" % d for d in range(10)] + list(SUITES.values())
+    names = ["%s/file%d%s.go" % (rnd.choice(directories), f, "_test" if f % 2 else "") for f in range(files)]
+    stream = []
+    for i in range(commits):
+        author = rnd.choice(AUTHORS)
+        identity = "%s <%s@example.com> %d +0000" % (author, author.split()[0].lower(), GENESIS + 60 * i)
+        message = (rnd.choice(MESSAGES) % i).encode("utf-8")
+        stream += [b"commit refs/heads/main", b"mark :%d" % (i + 1), b"author " + identity.encode("utf-8"),
+                   b"committer " + identity.encode("utf-8"), b"data %d" % len(message), message]
+        if i:
+            stream.append(b"from :%d" % i)
+        for name in rnd.sample(names, min(len(names), rnd.randint(1, 4))):
+            content = b"package p\n\n// %d %d\n" % (i, rnd.getrandbits(32))
+            stream += [b"M 100644 inline " + name.encode("utf-8"), b"data %d" % len(content), content]
+        stream.append(b"")
+
+    subprocess.run(["git", "init", "--quiet", path], check=True)
+    subprocess.run(["git", "fast-import", "--quiet"], input=b"\n".join(stream) + b"\n", cwd=path, check=True)
+    return path
+
+
+# Writes the coverage profile "go test -coverprofile" writes for the packages of a synthetic module, and returns the
+# changed line ranges of a few of its go files, the way the coverage guard reads them from "git diff".
+def generate_profile(path, packages, seed=1):
+    rnd = random.Random(seed)
+    changes = {}
+    with open(path, "w") as profile_file:
+        profile_file.write("mode: set\n")
+        for p in range(packages):
+            for f in range(PROFILE_FILES):
+                name = "pkg/p%d/sub%d/file%d.go" % (p // 10, p, f)
+                line = 1
+                for _ in range(PROFILE_BLOCKS):
+                    start, line = line + rnd.randint(0, 3), line + rnd.randint(1, 12)
+                    profile_file.write("%s/%s:%d.%d,%d.%d %d %d\n" % (MODULE, name, start, rnd.randint(1, 40), line,
+                                                                      rnd.randint(1, 40), rnd.randint(0, 6),
+                                                                      rnd.random() < 0.7))
+                if rnd.random() < 0.2:
+                    first = rnd.randint(1, line)
+                    changes[name] = [(first, first + rnd.randint(0, 30)), (line // 2, line // 2 + 5)]
+
+    return changes
+
+
+# Returns the SHA-256 of the output in its JSON form, so the outputs are compared across runs without being stored.
+def digest(output):
+    if not isinstance(output, str):
+        output = json.dumps(output, sort_keys=True, default=str)
+    return hashlib.sha256(output.encode("utf-8")).hexdigest()
+
+
+# The hot path of gauge-sprint-commits.py: the history walk and the classification of the changed files.
+def setup_gauge(path, size, args):
+    return Repo(generate_repository(path, size, args.repo_files)), int(time.time() - GENESIS) // 86400 + 1
+
+
+def run_gauge(fixture, tool):
+    repo, days = fixture
+    return list(tool.gauge(tool.collect_commits(repo, days), tool.PathClassifier(SUITES)))
+
+
+# The hot path of spm.py: the scan of the go files and the grouping of their imports.
+def setup_spm(path, size, args):
+    return generate_module(path, size, args.files, args.lines) + "/"
+
+
+def run_spm(path, tool):
+    dependencies = tool.fetch_deps(path, list(tool.DIRS_TO_SKIP), 1)
+    return tool.group_deps(dict(sorted(dependencies.items())), MODULE + "/")
+
+
+# The hot path of compare.py: the streamed comparison of two metrics files.
+def setup_compare(path, size, args):
+    return (generate_metrics(os.path.join(path, "base.json"), size, 1),
+            generate_metrics(os.path.join(path, "target.json"), size, 2))
+
+
+def run_compare(paths, tool):
+    out = io.StringIO()
+    tool.compare(tool.sorted_metrics(paths[0]), tool.sorted_metrics(paths[1]), tool.JsonWriter(out))
+    return out.getvalue()
+
+
+# The hot path of highlighter.py: the single pass highlighting of a report.
+def setup_highlight(path, size, args):
+    rnd = random.Random(1)
+    terms = generate_terms(args.terms, 0.1, rnd)
+    return generate_report(size * 2 ** 10, terms, rnd), terms
+
+
+def run_highlight(fixture, tool):
+    report, terms = fixture
+    return tool.highlight_keywords(report, terms)
+
+
+# The hot path of coverage_guard.py: the parsing of the coverage profile and the coverage of the changed lines.
+def setup_coverage(path, size, args):
+    profile_path = os.path.join(path, "coverage.out")
+    return profile_path, generate_profile(profile_path, size)
+
+
+def run_coverage(fixture, tool):
+    profile_path, changes = fixture
+    with open(profile_path, "r") as profile_file:
+        blocks = tool.parse_profile(profile_file)
+    indexes = tool.index_blocks(blocks, MODULE)
+    return {"totals": tool.profile_totals(blocks, MODULE),
+            "changed": {name: sorted(tool.changed_lines_coverage(indexes[name], ranges).items())
+                        for name, ranges in sorted(changes.items())}}
+
+
+# The cases by the qa-toolkit commands of their tools: the unit of the size, the default sizes, the generator of the
+# input of a size and the hot path run on it.
+CASES = {
+    "gauge": ("commits", (500, 1000, 2000), setup_gauge, run_gauge),
+    "spm": ("packages", (100, 200, 400), setup_spm, run_spm),
+    "compare": ("packages", (1000, 2000, 4000), setup_compare, run_compare),
+    "highlight": ("KB", (1024, 2048, 4096), setup_highlight, run_highlight),
+    "coverage": ("packages", (100, 200, 400), setup_coverage, run_coverage),
+}
+
+
+# Returns the stored baseline by the case and the size, or None if it is missing or of another version.
+def read_baseline(path):
+    try:
+        with open(path, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        return None
+
+    return baseline["cases"] if baseline.get("version") == BASELINE_VERSION else None
+
+
+# Writes the results of the cases run over their previous ones in the baseline, the other cases are kept.
+def write_baseline(path, results):
+    cases = read_baseline(path) or {}
+    for case in {result[0] for result in results}:
+        cases[case] = {}
+    for case, size, elapsed, output_digest in results:
+        cases[case][str(size)] = {"seconds": round(elapsed, 4), "digest": output_digest}
+    with open(path, "w") as baseline_file:
+        json.dump({"version": BASELINE_VERSION, "cases": cases}, baseline_file, indent=4, sort_keys=True)
+        baseline_file.write("\n")
+
+
+# Returns the exponent of the growth of the time between two sizes: 1 for a linear hot path, 2 for a quadratic one.
+def scaling(size, elapsed, previous):
+    if not previous or previous[1] <= 0 or elapsed <= 0:
+        return ""
+    return "%.2f" % (math.log(elapsed / previous[1]) / math.log(size / previous[0]))
+
+
+if "__main__" == __name__:
+    parser = ArgumentParser()
+    parser.add_argument("--cases", dest="cases", nargs="+", choices=tuple(CASES), default=list(CASES),
+                        help="The cases to run")
+    parser.add_argument("--scale", dest="scale", type=float, default=1,
+                        help="A factor of the default sizes, e.g. 0.25 for a quick run")
+    parser.add_argument("--repo-files", dest="repo_files", type=int, default=200,
+                        help="A number of files of the synthetic git repository")
+    parser.add_argument("--files", dest="files", type=int, default=4, help="A number of go files per package")
+    parser.add_argument("--lines", dest="lines", type=int, default=100, help="A number of body lines per go file")
+    parser.add_argument("--terms", dest="terms", type=int, default=300, help="A number of glossary terms")
+    parser.add_argument("--rounds", dest="rounds", type=int, default=5, help="A number of rounds per size")
+    parser.add_argument("--baseline", dest="baseline", default=PATH_BASELINE,
+                        help="A path to the baseline to compare the times and the outputs with")
+    parser.add_argument("--save-baseline", dest="save_baseline", action="store_true",
+                        help="Saves the results as the baseline instead of comparing them")
+    parser.add_argument("--tolerance", dest="tolerance", type=float, default=TOLERANCE,
+                        help="The slowdown over the baseline which fails the suite, %%")
+    args = parser.parse_args()
+
+    baseline = None if args.save_baseline else read_baseline(args.baseline)
+
+    results = []
+    failures = []
+    table = PrettyTable(("Case", "Size", "Best time, s", "Scaling", "Baseline, s", "Change", "Output"))
+    directory = tempfile.mkdtemp()
+    try:
+        for case in args.cases:
+            unit, sizes, setup, run = CASES[case]
+            tool = qa_toolkit.load(case)
+            previous = None
+            for size in sorted({max(1, round(size * args.scale)) for size in sizes}):
+                path = tempfile.mkdtemp(dir=directory)
+                fixture = setup(path, size, args)
+                elapsed, output = measure(lambda: run(fixture, tool), args.rounds)
+                output_digest = digest(output)
+                results.append((case, size, elapsed, output_digest))
+                shutil.rmtree(path)
+
+                expected = (baseline or {}).get(case, {}).get(str(size))
+                change, output_status = "", "new"
+                if expected:
+                    change = "%+.0f%%" % (100 * (elapsed / expected["seconds"] - 1))
+                    output_status = "same" if expected["digest"] == output_digest else "changed"
+                    if output_status == "changed":
+                        failures.append("the output of %s at %d %s differs from the baseline" % (case, size, unit))
+                    if elapsed > expected["seconds"] * (1 + args.tolerance / 100):
+                        failures.append("%s at %d %s is %s slower than the baseline" % (case, size, unit, change))
+                table.add_row((case, "%d %s" % (size, unit), "%.3f" % elapsed, scaling(size, elapsed, previous),
+                               "%.3f" % expected["seconds"] if expected else "", change, output_status))
+                previous = (size, elapsed)
+    finally:
+        shutil.rmtree(directory)
+
+    table.align["Case"] = "l"
+    for column in ("Size", "Best time, s", "Scaling", "Baseline, s", "Change"):
+        table.align[column] = "r"
+    print(table)
+
+    if args.save_baseline:
+        write_baseline(args.baseline, results)
+        print('The baseline is saved to "%s".' % args.baseline)
+    elif failures:
+        raise AssertionError("The benchmarks failed against the baseline: %s" % "; ".join(failures))
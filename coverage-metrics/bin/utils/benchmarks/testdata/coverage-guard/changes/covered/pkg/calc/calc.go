@@ -0,0 +1,11 @@
+package calc
+
+// Add returns the sum of the numbers.
+func Add(a, b int) int {
+	return a + b
+}
+
+// Sub returns the difference of the numbers.
+func Sub(a, b int) int {
+	return a - b
+}
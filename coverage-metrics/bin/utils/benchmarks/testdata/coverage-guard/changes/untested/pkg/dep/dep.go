@@ -0,0 +1,14 @@
+package dep
+
+// Version returns the version of the dependency.
+func Version() string {
+	return "v1"
+}
+
+// Abs returns the absolute value of the number.
+func Abs(x int) int {
+	if x < 0 {
+		return -x
+	}
+	return x
+}
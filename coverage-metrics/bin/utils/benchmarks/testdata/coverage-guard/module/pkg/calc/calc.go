@@ -0,0 +1,6 @@
+package calc
+
+// Add returns the sum of the numbers.
+func Add(a, b int) int {
+	return a + b
+}
@@ -0,0 +1,3 @@
+package fixture
+
+var Numbers = []int{1, 2}
@@ -0,0 +1,9 @@
+package consts
+
+// Limit is the maximum number of retries.
+const Limit = 1
+
+// Options holds the settings of a retry.
+type Options struct {
+	Limit int
+}
@@ -0,0 +1,6 @@
+package dep
+
+// Version returns the version of the dependency.
+func Version() string {
+	return "v1"
+}
@@ -0,0 +1,12 @@
+package aliases
+
+import (
+	_ "embed"
+	. "errors"
+	corev1 "k8s.io/api/core/v1"
+	metav1 "k8s.io/apimachinery/pkg/apis/meta/v1"
+)
+
+var _ = New
+var _ corev1.Pod
+var _ metav1.Time
@@ -0,0 +1,12 @@
+package blockcomment
+
+/*
+import "github.com/fake/commented"
+import (
+	"github.com/fake/grouped"
+)
+*/
+
+import "context"
+
+var _ = context.Background
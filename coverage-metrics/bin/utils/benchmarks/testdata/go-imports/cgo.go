@@ -0,0 +1,14 @@
+//go:build cgo
+
+package cgo
+
+/*
+#include <stdlib.h>
+#include "import.h"
+*/
+import "C"
+
+import "unsafe"
+
+var _ = unsafe.Pointer(nil)
+var _ = C.free
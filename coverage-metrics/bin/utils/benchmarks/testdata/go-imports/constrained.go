@@ -0,0 +1,9 @@
+// Copyright header.
+
+//go:build linux && (amd64 || arm64) && !purego
+
+package constrained
+
+import "syscall"
+
+var _ = syscall.Getpid
@@ -0,0 +1,9 @@
+package emptygroup
+
+import ()
+
+import (
+	"path"
+)
+
+var _ = path.Join
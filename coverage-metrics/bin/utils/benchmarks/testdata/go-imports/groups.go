@@ -0,0 +1,14 @@
+package groups
+
+import (
+	"fmt"
+	"os"
+)
+
+import (
+	"strings"
+)
+
+import "time"
+
+func Now() string { return fmt.Sprint(time.Now(), os.Args, strings.ToLower("A")) }
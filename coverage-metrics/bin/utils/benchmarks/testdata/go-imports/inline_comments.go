@@ -0,0 +1,12 @@
+package inlinecomments // import "github.com/fake/vanity"
+
+import (
+	"sort" // keeps the order stable (see below)
+	/* ) */ "sync"
+	// "github.com/fake/disabled"
+	"unicode" /* trailing ) */
+)
+
+var _ = sort.Strings
+var _ sync.Mutex
+var _ = unicode.IsUpper
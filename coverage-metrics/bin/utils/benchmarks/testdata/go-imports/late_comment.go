@@ -0,0 +1,14 @@
+package latecomment
+
+import "strconv"
+
+// Usage:
+//
+//	import "fmt"
+//	fmt.Println(strconv.Itoa(1))
+func Itoa(i int) string { return strconv.Itoa(i) }
+
+/*
+import "github.com/fake/late"
+*/
+var _ = Itoa
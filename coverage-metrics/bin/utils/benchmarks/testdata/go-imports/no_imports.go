@@ -0,0 +1,3 @@
+package noimports
+
+const Answer = 42
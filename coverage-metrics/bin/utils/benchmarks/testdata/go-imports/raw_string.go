@@ -0,0 +1,5 @@
+package rawstring
+
+import `net/http`
+
+var _ = http.Get
@@ -0,0 +1,6 @@
+package singleline
+
+import ("bytes"; "io")
+
+var _ = bytes.NewBuffer
+var _ io.Reader
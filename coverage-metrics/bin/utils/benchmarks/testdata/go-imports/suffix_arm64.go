@@ -0,0 +1,5 @@
+package constrained
+
+import "math/bits"
+
+var _ = bits.Len
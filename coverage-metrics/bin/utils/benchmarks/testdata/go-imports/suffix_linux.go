@@ -0,0 +1,5 @@
+package constrained
+
+import "golang.org/x/sys/unix"
+
+var _ = unix.Getpid
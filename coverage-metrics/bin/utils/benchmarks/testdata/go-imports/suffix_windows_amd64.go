@@ -0,0 +1,5 @@
+package constrained
+
+import "golang.org/x/sys/windows"
+
+var _ = windows.GetCurrentProcessId
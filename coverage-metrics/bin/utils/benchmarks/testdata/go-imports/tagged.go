@@ -0,0 +1,7 @@
+//go:build integration
+
+package constrained
+
+import "testing"
+
+var _ = testing.Short
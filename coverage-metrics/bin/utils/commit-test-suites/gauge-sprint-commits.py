@@ -1,12 +1,31 @@
 #!/usr/bin/env python3
 
+import contextlib
+import csv
+import datetime
+import json
 import os
 import re
+import sqlite3
+import sys
 import tempfile
+import threading
+import time
 
 from argparse import ArgumentParser
-from git import Repo
-from prettytable import PrettyTable
+from concurrent.futures import ThreadPoolExecutor
+
+# The shared toolkit package is next to the tool directories.
+PATH_UTILS = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if PATH_UTILS not in sys.path:
+    sys.path.insert(0, PATH_UTILS)
+from qa_toolkit import timings  # noqa: E402
+from qa_toolkit.core import Colour, lazy_import  # noqa: E402
+from qa_toolkit.timings import timed, timed_iter  # noqa: E402
+
+git = lazy_import("git")
+prettytable = lazy_import("prettytable")
+yaml = lazy_import("yaml")
 
 PREFIX_FEAT = "feat"
 PREFIX_FIX = "fix"
@@ -14,42 +33,183 @@ PREFIX_REFACTOR = "refactor"
 PREFIX_TEST = "test"
 
 
-class Colour:
-    RED = "\033[91m"
-    GREEN = "\033[92m"
-    BLUE = "\033[94m"
-    # Resets the colour to the default one
-    RESET = "\x1b[0m"
-    # Dims the current colour
-    DIM = '\033[2m'
-
-    @staticmethod
-    # Highlights the text with a specified colour.
-    def highlight(text, colour):
-        return f'{colour}{text}{Colour.RESET}'
-
+class Commit:
+    def __init__(self, sha, message, files, author=None, committed_at=None):
+        self.sha = sha
+        self.message = message
+        self.files = files
+        self.author = author
+        # The committed date as a UNIX timestamp.
+        self.committed_at = committed_at
 
-class File:
-    @staticmethod
-    def is_test(name):
-        return name.endswith("_test.go")
 
-    @staticmethod
-    def is_test_in_path(name, test_path):
-        return File.is_test(name) and test_path is not None and name.startswith(test_path)
-
-
-PATH_REPO = tempfile.mkdtemp()
 BRANCH_MAIN = "main"
+TEST_SUFFIX = "_test.go"
+
+# The built-in test suites. Test files are unit tests unless they are under the path of another suite.
+SUITE_UNIT = "unit"
+SUITE_INTEGRATION = "integration"
+SUITE_E2E = "e2e"
+SUITE_LABELS = {
+    SUITE_UNIT: "Unit",
+    SUITE_INTEGRATION: "Integration",
+    SUITE_E2E: "E2E",
+}
+
+# The attributes of the repositories manifest.
+ATTR_REPOSITORIES = "repositories"
+ATTR_URL = "url"
+ATTR_PATH = "path"
+ATTR_E2E = "e2e"
+ATTR_INTEGRATION = "integration"
+ATTR_EXCLUDE = "exclude"
+ATTR_SUITES = "suites"
+
+# The counters of the aggregation and the conventional commit types they count.
+AGGREGATION_TOTAL = "total"
+AGGREGATION_TYPES = (("features", PREFIX_FEAT), ("fixes", PREFIX_FIX), ("tests", PREFIX_TEST))
+AGGREGATION_COUNTERS = (AGGREGATION_TOTAL,) + tuple(counter for counter, _ in AGGREGATION_TYPES)
+
+# The breakdowns of the aggregation.
+BREAKDOWN_AUTHOR = "author"
+BREAKDOWN_SCOPE = "scope"
+
+# The time buckets of the trend series.
+BUCKET_WEEK = "week"
+BUCKET_SPRINT = "sprint"
+BUCKET_MONTH = "month"
+# The default sprint length and the date the sprints are counted from.
+SPRINT_DAYS = 14
+SPRINT_START = "2024-01-01"
+
+# The output formats.
+FORMAT_TABLE = "table"
+FORMAT_NDJSON = "ndjson"
+FORMAT_JSON = "json"
+FORMAT_CSV = "csv"
+
+# The default number of repositories gauged concurrently.
+JOBS = 4
+
+# The version of the commit cache schema.
+CACHE_VERSION = 3
+# The defaults for the commit cache eviction.
+CACHE_MAX_AGE_DAYS = 90
+CACHE_MAX_ENTRIES = 100000
+# The number of commits to read from the cache or to analyse at once.
+CACHE_BATCH = 500
+
+# The strategies to clone the repository with. The changed files are read from the trees of every commit, so the trees
+# are always fetched: a treeless clone would fetch them lazily, one request per commit.
+CLONE_FULL = "full"
+CLONE_SHALLOW = "shallow"
+CLONE_BLOBLESS = "blobless"
+
+# The engines to collect the changed files of commits with.
+ENGINE_LOG = "log"
+ENGINE_STATS = "stats"
+
+# The separators of the commit records in the "git log" output.
+RECORD_START = "\x1e"
+RECORD_END = "\x1f"
 
 # The pattern for the conventional commit message.
 # https://www.conventionalcommits.org/en/v1.0.0/
 CONVENTIONAL_COMMIT_RE = re.compile(r"^([\w]{3,}){1}(\([\w\-.,\s]+\))?(!)?: ([\w ])+([\s\S]*)$")
 
 
-# A predicate for commits that are reportable.
-def filter_relevant_commit(commit_message):
-    if not CONVENTIONAL_COMMIT_RE.match(commit_message):
+# Buckets the changed files into test suites with a single regular expression compiled from the excluded paths and the
+# suite paths. Every path prefix is an optional lookahead anchored at the start, so one match reports all the prefixes
+# a path starts with. A test file belongs to every suite it is under, and to the unit suite if it is under none.
+class PathClassifier:
+    def __init__(self, suites, exclude=()):
+        self.suites = list(suites)
+        groups = ["|".join(re.escape(e) for e in exclude) if exclude else "(?!)"]
+        groups += [re.escape(suites[s]) for s in self.suites]
+        groups.append(".*" + re.escape(TEST_SUFFIX) + "$")
+        self.regexp = re.compile("^" + "".join("(?=(%s))?" % g for g in groups))
+        self.classified = {}
+
+    # Returns the suites the file counts for.
+    def classify(self, name):
+        if name in self.classified:
+            return self.classified[name]
+
+        excluded, *in_suites, is_test = self.regexp.match(name).groups()
+        if excluded is not None or is_test is None:
+            suites = ()
+        else:
+            suites = tuple(s for s, p in zip(self.suites, in_suites) if p is not None) or (SUITE_UNIT,)
+        self.classified[name] = suites
+
+        return suites
+
+    # Returns the number of changed test files per suite.
+    def count(self, names):
+        counts = dict.fromkeys([SUITE_UNIT] + self.suites, 0)
+        for name in names:
+            for suite in self.classify(name):
+                counts[suite] += 1
+
+        return counts
+
+
+# The on-disk cache of the commit messages and changed files keyed by the commit SHA.
+# The entries not used for max_age_days are evicted, as well as the least recently used ones above max_entries.
+class CommitCache:
+    def __init__(self, path, max_age_days=CACHE_MAX_AGE_DAYS, max_entries=CACHE_MAX_ENTRIES):
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        # Concurrently gauged repositories share the cache, so wait for the other writers.
+        self.db = sqlite3.connect(path, timeout=60)
+        # The caches of the previous versions are dropped, the commits are analysed again.
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != CACHE_VERSION:
+            self.db.execute("DROP TABLE IF EXISTS commits")
+            self.db.execute("PRAGMA user_version = %d" % CACHE_VERSION)
+        self.db.execute("CREATE TABLE IF NOT EXISTS commits "
+                        "(sha TEXT PRIMARY KEY, message TEXT NOT NULL, author TEXT NOT NULL, "
+                        "committed_at INTEGER NOT NULL, files TEXT NOT NULL, used_at REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS commits_used_at ON commits (used_at)")
+
+    # Returns the cached commits for the SHAs as a dict and marks them as used.
+    def get(self, shas):
+        now = time.time()
+        commits = {}
+        for i in range(0, len(shas), CACHE_BATCH):
+            batch = shas[i:i + CACHE_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.db.execute("SELECT sha, message, author, committed_at, files FROM commits "
+                                   "WHERE sha IN (%s)" % placeholders, batch)
+            for sha, message, author, committed_at, files in rows:
+                commits[sha] = Commit(sha, message, files.split("\n") if files else [], author, committed_at)
+            self.db.execute("UPDATE commits SET used_at = ? WHERE sha IN (%s)" % placeholders, [now] + batch)
+        self.db.commit()
+
+        return commits
+
+    def put(self, commits):
+        now = time.time()
+        self.db.executemany("INSERT OR REPLACE INTO commits (sha, message, author, committed_at, files, used_at) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            [(c.sha, c.message, c.author, c.committed_at, "\n".join(c.files), now) for c in commits])
+        self.db.commit()
+
+    def evict(self):
+        self.db.execute("DELETE FROM commits WHERE used_at < ?", (time.time() - self.max_age_days * 86400,))
+        self.db.execute("DELETE FROM commits WHERE sha NOT IN "
+                        "(SELECT sha FROM commits ORDER BY used_at DESC LIMIT ?)", (self.max_entries,))
+        self.db.commit()
+
+    def close(self):
+        self.evict()
+        self.db.close()
+
+
+# A predicate for commits that are reportable. The match of the CONVENTIONAL_COMMIT_RE is passed when it is known.
+def filter_relevant_commit(commit_message, conventional_match=False):
+    if conventional_match is False:
+        conventional_match = CONVENTIONAL_COMMIT_RE.match(commit_message)
+    if not conventional_match:
         return True
 
     is_feature = commit_message.startswith(PREFIX_FEAT)
@@ -60,31 +220,232 @@ def filter_relevant_commit(commit_message):
     return is_feature or is_test or is_fix or is_refactor
 
 
-# Breaks down the test modified files into distinct test suites (unit, e2e and integration) for commits collection.
-def gauge(commits, paths):
-    # Normalise the commit messages.
+# Streams the commits with their changed files from a single "git log" run over the revisions.
+# The changed files match the ones of "Commit.stats": the diff against the first parent without rename detection.
+def log_commits(repo, *revisions):
+    process = repo.git.log(*revisions,
+                           "--format=%s%%H%s%%an%s%%ct%%n%%B%s" % (RECORD_START, RECORD_END, RECORD_END, RECORD_END),
+                           "--name-only", "--no-renames", "--diff-merges=first-parent", "--no-color",
+                           as_process=True)
+    commit = None
+    in_message = False
+    for raw_line in process.stdout:
+        line = raw_line.decode("utf-8", errors="replace").rstrip("\n")
+        if line.startswith(RECORD_START):
+            if commit:
+                yield commit
+            sha, author, committed_at = line[len(RECORD_START):].split(RECORD_END, 2)
+            commit = Commit(sha, None, [], author, int(committed_at))
+            message = []
+            in_message = True
+        elif in_message:
+            if line.endswith(RECORD_END):
+                message.append(line[:-len(RECORD_END)])
+                commit.message = "\n".join(message)
+                in_message = False
+            else:
+                message.append(line)
+        elif line:
+            commit.files.append(line)
+
+    if commit:
+        yield commit
+    process.wait()
+
+
+# Collects the commits with their changed files from a single streamed "git log" run over the whole range.
+def collect_commits(repo, days):
+    return log_commits(repo, "--all", "--since=%d.days.ago" % days)
+
+
+# Collects the commits with their changed files using a "git diff" per commit.
+def collect_commits_stats(repo, days):
+    for c in repo.iter_commits("--all", since="%d.days.ago" % days):
+        with timings.phase("commit_stats"):
+            files = list(c.stats.files.keys())
+        yield Commit(c.hexsha, c.message, files, c.author.name, c.committed_date)
+
+
+# Collects the commits for the last days analysing only the ones missing in the cache.
+# The cache holds the messages and the changed files, which never change for a commit, so the classification into
+# test suites is always recomputed and follows the current --e2e, --integration and --exclude paths.
+# The SHAs are streamed from "git rev-list" and the commits are yielded a batch at a time in its order, so the first
+# ones are gauged before the rest are analysed.
+def collect_cached_commits(repo, days, cache, engine):
+    process = repo.git.rev_list("--all", "--since=%d.days.ago" % days, as_process=True)
+    batch = []
+    for line in process.stdout:
+        batch.append(line.decode("ascii").strip())
+        if len(batch) == CACHE_BATCH:
+            yield from cached_batch(repo, batch, cache, engine)
+            batch = []
+    if batch:
+        yield from cached_batch(repo, batch, cache, engine)
+    process.wait()
+
+
+# Returns the commits of the batch of SHAs in its order, analysing the ones missing in the cache and caching them.
+def cached_batch(repo, shas, cache, engine):
+    commits = cache.get(shas)
+    missing = [sha for sha in shas if sha not in commits]
+    if missing:
+        if engine == ENGINE_LOG:
+            analysed = list(log_commits(repo, "--no-walk=unsorted", *missing))
+        else:
+            analysed = [Commit(sha, c.message, list(c.stats.files.keys()), c.author.name, c.committed_date)
+                        for sha, c in ((sha, repo.commit(sha)) for sha in missing)]
+        cache.put(analysed)
+        commits.update((c.sha, c) for c in analysed)
+
+    return [commits[sha] for sha in shas]
+
+
+# Returns the total size of the files under the path in bytes.
+def disk_usage(path):
+    size = 0
+    for root, dirs, files in os.walk(path):
+        size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+
+    return size
+
+
+def format_bytes(size):
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return "%.1f %s" % (size, unit)
+        size /= 1024
+
+    return "%.1f GiB" % size
+
+
+# Clones the repository fetching only the objects the report for the last days needs.
+# Only the commits and trees are required to list the changed files, so neither blobs nor a working tree are fetched
+# unless the full strategy is requested. The shallow strategy cuts the history at the report window and deepens it by
+# one commit afterwards, so the oldest commits in the window still have a parent to diff against.
+# Returns the repository with the clone duration in seconds and the size of its objects on disk in bytes. The size is
+# not the number of bytes transferred: the objects fetched lazily later are not in it, and the packs of a deepened
+# shallow clone may hold some objects twice.
+@timed("clone")
+def clone(url, path, strategy, days):
+    options = {"branch": BRANCH_MAIN}
+    if strategy != CLONE_FULL:
+        options["no_checkout"] = True
+        options["filter"] = "blob:none"
+    if strategy == CLONE_SHALLOW:
+        options["shallow_since"] = "%d.days.ago" % (days + 1)
+        options["no_single_branch"] = True
+
+    started = time.perf_counter()
+    repo = git.Repo.clone_from(url, path, **options)
+    if strategy == CLONE_SHALLOW:
+        repo.git.fetch("--deepen=1")
+    elapsed = time.perf_counter() - started
+
+    return repo, elapsed, disk_usage(os.path.join(repo.git_dir, "objects"))
+
+
+# Breaks down the test modified files into distinct test suites for commits collection.
+# The commits are gauged one by one as they are collected, so the history is never held in memory at once.
+def gauge(commits, classifier):
     for c in commits:
+        # Normalise the commit message.
         c.message = c.message.split("\n")[0]
-    filtered_commits = filter(lambda commit: filter_relevant_commit(commit.message), commits)
-
-    gauged_commits = []
-    for c in filtered_commits:
-        changed_files = [f for f in c.stats.files.keys() if not f.startswith(paths["exclude"])]
-        changed_unit_tests = [f for f in changed_files if File.is_test(f) and
-                              not File.is_test_in_path(f, paths["e2e"]) and
-                              not File.is_test_in_path(f, paths["integration"])
-                              ]
-        changed_integration_tests = [f for f in changed_files if File.is_test_in_path(f, paths["integration"])]
-        changed_e2e_tests = [f for f in changed_files if File.is_test_in_path(f, paths["e2e"])]
-
-        gauged_commits.append({
+        conventional_match = CONVENTIONAL_COMMIT_RE.match(c.message)
+        if not filter_relevant_commit(c.message, conventional_match):
+            continue
+
+        gauged_commit = {
             "message": c.message,
-            "unit_tests": len(changed_unit_tests),
-            "integration_tests": len(changed_integration_tests),
-            "e2e_tests": len(changed_e2e_tests),
-        })
+            "author": c.author,
+            "committed_at": c.committed_at,
+            # The type and the scope of a conventional commit message, e.g.: "feat" and "api" for "feat(api): ...".
+            "type": conventional_match.group(1) if conventional_match else None,
+            "scope": conventional_match.group(2)[1:-1].strip() if conventional_match and conventional_match.group(2)
+            else None,
+        }
+        for suite, count in classifier.count(c.files).items():
+            gauged_commit[suite_key(suite)] = count
+
+        yield gauged_commit
 
-    return gauged_commits
+
+# Returns the key of the changed test files count of the suite in a gauged commit.
+def suite_key(suite):
+    return "%s_tests" % suite
+
+
+def suite_label(suite):
+    return SUITE_LABELS.get(suite, suite.capitalize())
+
+
+# Returns the key of the time bucket of the commit: the ISO date the week, the sprint or the month starts at (UTC).
+# Sprints are sprint_days long and counted from the sprint_start date.
+def bucket_key(committed_at, bucket, sprint_start=None, sprint_days=SPRINT_DAYS):
+    date = datetime.datetime.fromtimestamp(committed_at, tz=datetime.timezone.utc).date()
+    if bucket == BUCKET_WEEK:
+        start = date - datetime.timedelta(days=date.weekday())
+    elif bucket == BUCKET_MONTH:
+        start = date.replace(day=1)
+    else:
+        start = sprint_start + datetime.timedelta(days=(date - sprint_start).days // sprint_days * sprint_days)
+
+    return start.isoformat()
+
+
+# Accumulates the aggregation counters of the gauged commits in a single pass: the number of PRs per kind (features,
+# fixes and tests), the number of PRs with changed tests per suite, and the same per author and per conventional commit
+# scope. Aggregations of several repositories or time slices are combined with merge().
+class Aggregator:
+    def __init__(self, suites):
+        self.suites = list(suites)
+        self.prs = dict.fromkeys(AGGREGATION_COUNTERS, 0)
+        self.suite_prs = {s: dict.fromkeys(AGGREGATION_COUNTERS, 0) for s in self.suites}
+        self.authors = {}
+        self.scopes = {}
+
+    def add(self, gauged_commit):
+        # The type parsed by gauge(), so e.g. "fix typo" or "feature: ..." are not counted as a fix or a feature.
+        commit_type = (gauged_commit.get("type") or "").lower()
+        counters = [AGGREGATION_TOTAL] + [c for c, t in AGGREGATION_TYPES if commit_type == t]
+        tested_suites = [s for s in self.suites if gauged_commit.get(suite_key(s), 0) > 0]
+
+        for counter in counters:
+            self.prs[counter] += 1
+            for suite in tested_suites:
+                self.suite_prs[suite][counter] += 1
+
+        breakdowns = [(self.authors, gauged_commit.get("author"))]
+        if gauged_commit.get("scope"):
+            breakdowns.append((self.scopes, gauged_commit["scope"]))
+        for breakdown, key in breakdowns:
+            entry = breakdown.setdefault(key, {"prs": 0, "suites": {}})
+            entry["prs"] += 1
+            for suite in tested_suites:
+                entry["suites"][suite] = entry["suites"].get(suite, 0) + 1
+
+        return self
+
+    def merge(self, other):
+        for suite in other.suites:
+            if suite not in self.suite_prs:
+                self.suites.append(suite)
+                self.suite_prs[suite] = dict.fromkeys(AGGREGATION_COUNTERS, 0)
+            for counter in AGGREGATION_COUNTERS:
+                self.suite_prs[suite][counter] += other.suite_prs[suite][counter]
+        for counter in AGGREGATION_COUNTERS:
+            self.prs[counter] += other.prs[counter]
+
+        for breakdown, other_breakdown in ((self.authors, other.authors), (self.scopes, other.scopes)):
+            for key, other_entry in other_breakdown.items():
+                entry = breakdown.setdefault(key, {"prs": 0, "suites": {}})
+                entry["prs"] += other_entry["prs"]
+                for suite, count in other_entry["suites"].items():
+                    entry["suites"][suite] = entry["suites"].get(suite, 0) + count
+
+        return self
+
+    def to_dict(self):
+        return {"prs": self.prs, "suites": self.suite_prs, "authors": self.authors, "scopes": self.scopes}
 
 
 def pad(number, percent):
@@ -96,82 +457,314 @@ def pad(number, percent):
 def normalise(args):
     try:
         args.days = int(args.days)
-    except TypeError:
-        raise "the --days parameter must be an integer value"
+    except (TypeError, ValueError):
+        raise ValueError("the --days parameter must be an integer value")
 
     if args.days < 1:
-        raise "the --days parameter must be an integer value greater that 0"
+        raise ValueError("the --days parameter must be an integer value greater that 0")
 
     if args.exclude_path:
         args.exclude_path = tuple(args.exclude_path)
     else:
         args.exclude_path = ()
 
+    repositories = read_manifest(args.manifest) if args.manifest else []
+    repositories += [{ATTR_URL: url} for url in args.repo_url or []]
+    repositories += [{ATTR_PATH: path} for path in args.repo_path or []]
+    if len(repositories) == 0:
+        raise ValueError("either the --repo-url, the --repo-path or the --manifest parameter must be set")
+
+    suites = {}
+    for suite in args.suites or []:
+        name, _, path = suite.partition("=")
+        if not name or not path or name == SUITE_UNIT:
+            raise ValueError('the --suite parameter must be in the "name=path" format, got: "%s"' % suite)
+        suites[name] = path
+
+    # The suite paths missing in the manifest default to the CLI ones.
+    for r in repositories:
+        r.setdefault(ATTR_E2E, args.e2e_path)
+        r.setdefault(ATTR_INTEGRATION, args.integration_path)
+        r[ATTR_EXCLUDE] = tuple(r[ATTR_EXCLUDE]) if ATTR_EXCLUDE in r else args.exclude_path
+        repository_suites = {SUITE_INTEGRATION: r[ATTR_INTEGRATION], SUITE_E2E: r[ATTR_E2E]}
+        repository_suites.update(r.get(ATTR_SUITES) or suites)
+        r[ATTR_SUITES] = {name: path for name, path in repository_suites.items() if path}
+    args.repositories = repositories
+
+    if args.jobs < 1:
+        raise ValueError("the --jobs parameter must be an integer value greater that 0")
+
+    if args.sprint_days < 1:
+        raise ValueError("the --sprint-days parameter must be an integer value greater that 0")
+    args.sprint_start = datetime.date.fromisoformat(args.sprint_start)
+
     return args
 
 
-def print_commits_report(gauged_commits, integration=False, e2e=False):
-    def pluck(data, penultimate=False, last=False):
-        entries = len(data)
-        if not last:
-            data.pop(entries - 1)
-        if not penultimate:
-            data.pop(entries - 2)
-        return data
+# Reads the list of repositories with their test suite paths from the YAML manifest.
+def read_manifest(path):
+    with open(path, "r") as manifest_file:
+        manifest = yaml.safe_load(manifest_file)
+
+    if not manifest or ATTR_REPOSITORIES not in manifest:
+        raise AttributeError('The manifest is malformed. The "%s" attribute is missing.' % ATTR_REPOSITORIES)
+
+    for r in manifest[ATTR_REPOSITORIES]:
+        if ATTR_URL not in r and ATTR_PATH not in r:
+            raise AttributeError('A repository in the manifest has neither "%s" nor "%s".' % (ATTR_URL, ATTR_PATH))
+
+    return manifest[ATTR_REPOSITORIES]
+
+
+# Returns the suites reported for the repository: the unit one followed by the configured ones.
+def repository_suites(repository):
+    return [SUITE_UNIT] + list(repository[ATTR_SUITES])
+
+
+# Clones (unless a local checkout is given) and gauges a single repository from the manifest.
+# Every gauged commit is passed to the writer as soon as it is produced.
+def gauge_repository(repository, args, writer):
+    result = {"name": repository.get(ATTR_URL) or repository[ATTR_PATH], "clone": None, "error": None}
+
+    with contextlib.ExitStack() as stack:
+        if ATTR_PATH in repository:
+            try:
+                repo = git.Repo(repository[ATTR_PATH])
+            except (git.exc.GitError, OSError) as e:
+                result["error"] = 'Cannot open the repository at path: "%s" (%s)' % (repository[ATTR_PATH],
+                                                                                      type(e).__name__)
+                return result
+        else:
+            # The clone is removed once the repository is gauged, so the runs leave nothing behind on the runners.
+            directory = stack.enter_context(tempfile.TemporaryDirectory())
+            try:
+                repo, clone_time, objects_size = clone(repository[ATTR_URL], directory, args.clone, args.days)
+            except:
+                result["error"] = 'Cannot clone the repository at URL: "%s"' % repository[ATTR_URL]
+                return result
+            result["clone"] = {"strategy": args.clone, "seconds": clone_time, "objects_bytes": objects_size}
+        stack.callback(repo.close)
+
+        # The history walk fails e.g. on a corrupted repository or a missing object; the other repositories go on.
+        try:
+            result["aggregator"], result["buckets"] = gauge_history(repo, repository, args, writer, result["name"])
+        except (git.exc.GitError, OSError) as e:
+            result["error"] = 'Cannot gauge the repository "%s" (%s)' % (result["name"], e)
+
+    return result
+
+
+# Collects and gauges the commits of the repository and returns their aggregation with the bucket ones.
+def gauge_history(repo, repository, args, writer, name):
+    cache = None
+    if args.cache_path:
+        cache = CommitCache(args.cache_path, args.cache_max_age, args.cache_max_entries)
+        commits = collect_cached_commits(repo, args.days, cache, args.engine)
+    else:
+        collect = collect_commits if args.engine == ENGINE_LOG else collect_commits_stats
+        commits = collect(repo, args.days)
 
-    table = PrettyTable(pluck(["Message", "Unit", "Integration", "E2E"], integration, e2e))
+    aggregator = Aggregator(repository_suites(repository))
+    buckets = {}
+    gauged_commits = gauge(timed_iter("collect_commits", commits),
+                           PathClassifier(repository[ATTR_SUITES], repository[ATTR_EXCLUDE]))
+    try:
+        for gauged_commit in timed_iter("gauge", gauged_commits):
+            aggregator.add(gauged_commit)
+            if args.bucket:
+                key = bucket_key(gauged_commit["committed_at"], args.bucket, args.sprint_start, args.sprint_days)
+                if key not in buckets:
+                    buckets[key] = Aggregator(repository_suites(repository))
+                buckets[key].add(gauged_commit)
+            with timings.phase("write"):
+                writer.commit(name, gauged_commit)
+    finally:
+        if cache:
+            cache.close()
+
+    return aggregator, buckets
+
+
+# Prints the commits and the aggregation tables once all the commits of a repository are gauged.
+class TableWriter:
+    def __init__(self, repositories, out, breakdowns=()):
+        self.repositories = repositories
+        self.out = out
+        self.breakdowns = breakdowns
+        self.gauged_commits = {}
+        self.lock = threading.Lock()
+
+    def commit(self, name, gauged_commit):
+        with self.lock:
+            self.gauged_commits.setdefault(name, []).append(gauged_commit)
+
+    def repository(self, result):
+        if len(self.repositories) > 1:
+            print(result["name"], file=self.out)
+        if result["error"]:
+            print(result["error"], file=self.out)
+            return
+        if result["clone"]:
+            print('Cloned "%s" (%s) in %.1fs, objects size %s' %
+                  (result["name"], result["clone"]["strategy"], result["clone"]["seconds"],
+                   format_bytes(result["clone"]["objects_bytes"])), file=self.out)
+
+        print_commits_report(self.gauged_commits.get(result["name"], []), result["aggregator"].suites, out=self.out)
+        self.aggregation(result["aggregator"], result["buckets"])
+
+    def total(self, aggregator, buckets):
+        print("Total", file=self.out)
+        self.aggregation(aggregator, buckets)
+
+    def aggregation(self, aggregator, buckets):
+        print_aggregation_report(aggregator, out=self.out)
+        for breakdown in self.breakdowns:
+            print_breakdown_report(aggregator, breakdown, out=self.out)
+        if buckets:
+            print_series_report(buckets, aggregator.suites, out=self.out)
+
+    def close(self):
+        pass
+
+
+# Writes the gauged commits as they are produced and the aggregations as the final records.
+# Only the aggregation counters are kept in memory, so the memory does not grow with the history size.
+class StreamWriter:
+    def __init__(self, repositories, out, breakdowns=()):
+        self.repositories = repositories
+        self.out = out
+        self.lock = threading.Lock()
+
+    def commit(self, name, gauged_commit):
+        with self.lock:
+            self.write_commit(name, gauged_commit)
+            self.out.flush()
+
+    def repository(self, result):
+        if result["error"]:
+            print(result["error"], file=sys.stderr)
+            return
+        self.write_aggregation(result["name"], None, result["aggregator"], result["clone"])
+        for key, bucket in sorted(result["buckets"].items()):
+            self.write_aggregation(result["name"], key, bucket, None)
+
+    def total(self, aggregator, buckets):
+        self.write_aggregation(None, None, aggregator, None)
+        for key, bucket in sorted(buckets.items()):
+            self.write_aggregation(None, key, bucket, None)
+
+    def close(self):
+        self.out.flush()
+
+
+class NdjsonWriter(StreamWriter):
+    def write_commit(self, name, gauged_commit):
+        self.out.write(json.dumps({"record": "commit", "repository": name, **gauged_commit}) + "\n")
+
+    def write_aggregation(self, name, bucket, aggregator, clone_stats):
+        self.out.write(json.dumps({"record": "aggregation", "repository": name, "bucket": bucket, "clone": clone_stats,
+                                   **aggregator.to_dict()}) + "\n")
+
+
+# Writes a single JSON document of the {"commits": [...], "aggregations": [...]} form element by element.
+class JsonWriter(StreamWriter):
+    def __init__(self, repositories, out, breakdowns=()):
+        super().__init__(repositories, out)
+        self.commits = 0
+        self.aggregations_written = 0
+        self.out.write('{"commits": [')
+
+    def write_commit(self, name, gauged_commit):
+        self.out.write((",\n" if self.commits else "\n") + json.dumps({"repository": name, **gauged_commit}))
+        self.commits += 1
+
+    def write_aggregation(self, name, bucket, aggregator, clone_stats):
+        if not self.aggregations_written:
+            self.out.write('\n], "aggregations": [')
+        self.out.write((",\n" if self.aggregations_written else "\n") +
+                       json.dumps({"repository": name, "bucket": bucket, "clone": clone_stats, **aggregator.to_dict()}))
+        self.aggregations_written += 1
+
+    def close(self):
+        if not self.aggregations_written:
+            self.out.write('\n], "aggregations": [')
+        self.out.write("\n]}\n")
+        super().close()
+
+
+# Writes the commits and the aggregations as the rows of a single CSV table. The commit rows have the suite columns
+# filled, the aggregation rows have one row per PRs and suite with the counter columns filled.
+class CsvWriter(StreamWriter):
+    def __init__(self, repositories, out, breakdowns=()):
+        super().__init__(repositories, out)
+        self.suites = [SUITE_UNIT] + list(dict.fromkeys(s for r in repositories for s in r[ATTR_SUITES]))
+        self.writer = csv.writer(out)
+        self.writer.writerow(["record", "repository", "bucket", "message", "author", "type", "scope"] +
+                             [suite_key(s) for s in self.suites] +
+                             list(AGGREGATION_COUNTERS))
+
+    def write_commit(self, name, gauged_commit):
+        self.writer.writerow(["commit", name, "", gauged_commit["message"], gauged_commit["author"],
+                              gauged_commit["type"], gauged_commit["scope"]] +
+                             [gauged_commit.get(suite_key(s), "") for s in self.suites] +
+                             [""] * len(AGGREGATION_COUNTERS))
+
+    # Writes the PRs and the suite rows, followed by a row per author and per scope with the number of their PRs as the
+    # total and their PRs with changed tests in the suite columns.
+    def write_aggregation(self, name, bucket, aggregator, clone_stats):
+        rows = [("PRs", aggregator.prs)] + [(suite_label(s), c) for s, c in aggregator.suite_prs.items()]
+        for label, counters in rows:
+            self.writer.writerow(["aggregation", name or "", bucket or "", label, "", "", ""] +
+                                 [""] * len(self.suites) +
+                                 [counters[counter] for counter in AGGREGATION_COUNTERS])
+        for breakdown, entries in ((BREAKDOWN_AUTHOR, aggregator.authors), (BREAKDOWN_SCOPE, aggregator.scopes)):
+            for key, entry in sorted(entries.items(), key=lambda e: (-e[1]["prs"], str(e[0]))):
+                self.writer.writerow(["aggregation", name or "", bucket or "", breakdown.capitalize(),
+                                      key if breakdown == BREAKDOWN_AUTHOR else "", "",
+                                      key if breakdown == BREAKDOWN_SCOPE else ""] +
+                                     [entry["suites"].get(s, 0) for s in self.suites] +
+                                     [entry["prs"]] + [""] * (len(AGGREGATION_COUNTERS) - 1))
+
+
+WRITERS = {
+    FORMAT_TABLE: TableWriter,
+    FORMAT_NDJSON: NdjsonWriter,
+    FORMAT_JSON: JsonWriter,
+    FORMAT_CSV: CsvWriter,
+}
+
+
+def print_commits_report(gauged_commits, suites, out=sys.stdout):
+    labels = [suite_label(s) for s in suites]
+    table = prettytable.PrettyTable(["Message"] + labels)
     for c in gauged_commits:
-        no_test_suites = c["e2e_tests"] == 0 and c["unit_tests"] == 0 and c["integration_tests"] == 0
+        no_test_suites = all(c[suite_key(s)] == 0 for s in suites)
         colour = Colour.RED if no_test_suites else Colour.RESET
-        table.add_row(pluck([
-            c["message"],
-            Colour.highlight(c["unit_tests"], colour),
-            Colour.highlight(c["integration_tests"], colour),
-            Colour.highlight(c["e2e_tests"], colour)
-        ], integration, e2e))
+        table.add_row([c["message"]] + [Colour.highlight(c[suite_key(s)], colour) for s in suites])
 
     table.align["Message"] = "l"
-    table.align["Unit"] = "r"
-    if integration:
-        table.align["Integration"] = "r"
-    if e2e:
-        table.align["E2E"] = "r"
-    print(table)
-
-
-def print_aggregation_report(commits, integration, e2e):
-    def suite_stats(index, commits, features, fixes, tests):
-        suite = [c for c in commits if c[index] > 0]
-        suite_features = [c for c in features if c[index] > 0]
-        suite_fixes = [c for c in fixes if c[index] > 0]
-        suite_tests = [c for c in tests if c[index] > 0]
-
-        return [
-            len(suite),
-            pad(len(suite_features), len(suite_features) / len(features) if len(features) else 0),
-            pad(len(suite_fixes), len(suite_fixes) / len(fixes) if len(fixes) else 0),
-            pad(len(suite_tests), len(suite_tests) / len(tests) if len(tests) else 0),
-        ]
-
-    table = PrettyTable(("", "Total", "Features", "Fixes", "Tests"))
-
-    features = [c for c in commits if c["message"].startswith(PREFIX_FEAT)]
-    fixes = [c for c in commits if c["message"].startswith(PREFIX_FIX)]
-    tests = [c for c in commits if c["message"].startswith(PREFIX_TEST)]
-    table.add_row((
-        "PRs", len(commits),
-        pad(len(features), len(features) / len(commits) if len(commits) else 0),
-        pad(len(fixes), len(fixes) / len(commits) if len(commits) else 0),
-        pad(len(tests), len(tests) / len(commits) if len(commits) else 0),
-    ))
+    for label in labels:
+        table.align[label] = "r"
+    print(table, file=out)
 
-    table.add_row(["Unit"] + suite_stats("unit_tests", commits, features, fixes, tests))
 
-    if integration:
-        table.add_row(["Integration"] + suite_stats("integration_tests", commits, features, fixes, tests))
+def print_aggregation_report(aggregator, out=sys.stdout):
+    table = prettytable.PrettyTable(("", "Total", "Features", "Fixes", "Tests"))
+
+    prs = aggregator.prs
+    table.add_row((
+        "PRs", prs[AGGREGATION_TOTAL],
+        *[pad(prs[counter], prs[counter] / prs[AGGREGATION_TOTAL] if prs[AGGREGATION_TOTAL] else 0)
+          for counter, _ in AGGREGATION_TYPES],
+    ))
 
-    if e2e:
-        table.add_row(["E2E"] + suite_stats("e2e_tests", commits, features, fixes, tests))
+    for suite in aggregator.suites:
+        suite_prs = aggregator.suite_prs[suite]
+        table.add_row((
+            suite_label(suite), suite_prs[AGGREGATION_TOTAL],
+            *[pad(suite_prs[counter], suite_prs[counter] / prs[counter] if prs[counter] else 0)
+              for counter, _ in AGGREGATION_TYPES],
+        ))
 
     table.align[""] = "l"
     table.align["Total"] = "r"
@@ -180,34 +773,120 @@ def print_aggregation_report(commits, integration, e2e):
     table.align["Features"] = "r"
     table.align["Fixes"] = "r"
     table.align["Tests"] = "r"
-    print(table)
-
-
-if "__main__" == __name__:
+    print(table, file=out)
+
+
+# Prints the number of PRs and the PRs with changed tests per suite for every author or scope.
+def print_breakdown_report(aggregator, breakdown, out=sys.stdout):
+    entries = aggregator.authors if breakdown == BREAKDOWN_AUTHOR else aggregator.scopes
+    title = breakdown.capitalize()
+    labels = [suite_label(s) for s in aggregator.suites]
+
+    table = prettytable.PrettyTable([title, "PRs"] + labels)
+    for key, entry in sorted(entries.items(), key=lambda e: (-e[1]["prs"], str(e[0]))):
+        table.add_row([key, entry["prs"]] +
+                      [pad(entry["suites"].get(s, 0), entry["suites"].get(s, 0) / entry["prs"])
+                       for s in aggregator.suites])
+
+    table.align[title] = "l"
+    table.align["PRs"] = "r"
+    for label in labels:
+        table.align[label] = "r"
+    print(table, file=out)
+
+
+# Prints the aggregation per time bucket: the number of PRs per kind and the PRs with changed tests per suite.
+def print_series_report(buckets, suites, out=sys.stdout):
+    labels = [suite_label(s) for s in suites]
+    table = prettytable.PrettyTable(["Bucket", "PRs", "Features", "Fixes", "Tests"] + labels)
+    for key, aggregator in sorted(buckets.items()):
+        prs = aggregator.prs[AGGREGATION_TOTAL]
+        table.add_row([key, prs] +
+                      [aggregator.prs[counter] for counter, _ in AGGREGATION_TYPES] +
+                      [pad(aggregator.suite_prs[s][AGGREGATION_TOTAL], aggregator.suite_prs[s][AGGREGATION_TOTAL] / prs)
+                       if s in aggregator.suite_prs else pad(0, 0) for s in suites])
+
+    table.align["Bucket"] = "l"
+    for column in ["PRs", "Features", "Fixes", "Tests"] + labels:
+        table.align[column] = "r"
+    print(table, file=out)
+
+
+def main(argv=None):
     parser = ArgumentParser()
-    parser.add_argument("--repo-url", dest="repo_url", help="A URL for the GitHub repository")
+    parser.add_argument("--repo-url", dest="repo_url", action='append',
+                        help="URLs for the GitHub repositories")
+    parser.add_argument("--repo-path", dest="repo_path", action='append',
+                        help="Paths to existing local checkouts of the repositories; skips cloning")
+    parser.add_argument("--manifest", dest="manifest",
+                        help="A path to the YAML manifest with the repositories and their test suite paths")
+    parser.add_argument("--jobs", dest="jobs", type=int, default=JOBS,
+                        help="A number of repositories cloned and gauged concurrently")
+    parser.add_argument("--clone", dest="clone", default=CLONE_SHALLOW,
+                        choices=(CLONE_SHALLOW, CLONE_BLOBLESS, CLONE_FULL),
+                        help="The clone strategy: history since --days without blobs (default), the whole history "
+                             "without blobs, or a full clone")
     parser.add_argument("--days", dest="days", help="A number of days for the report")
     parser.add_argument("--e2e", dest="e2e_path", help="A path to the directory with the E2E test suite")
     parser.add_argument("--integration", dest="integration_path",
                         help="A path to the directory with the integration test suite")
     parser.add_argument("--exclude", dest="exclude_path", action='append',
                         help="Paths to be excluded from the analysis")
-    args = parser.parse_args()
-    normalise(args)
-
+    parser.add_argument("--suite", dest="suites", action='append',
+                        help="Additional test suites in the name=path format (e.g.: fuzz=tests/fuzz)")
+    parser.add_argument("--cache", dest="cache_path",
+                        help="A path to the on-disk cache of the analysed commits; only new commits are analysed")
+    parser.add_argument("--cache-max-age", dest="cache_max_age", type=int, default=CACHE_MAX_AGE_DAYS,
+                        help="A number of days after which unused cache entries are evicted")
+    parser.add_argument("--cache-max-entries", dest="cache_max_entries", type=int, default=CACHE_MAX_ENTRIES,
+                        help="A maximum number of cache entries; the least recently used ones are evicted")
+    parser.add_argument("--breakdown", dest="breakdowns", action='append', choices=(BREAKDOWN_AUTHOR, BREAKDOWN_SCOPE),
+                        help="Adds the aggregation per commit author or per conventional commit scope to the tables")
+    parser.add_argument("--bucket", dest="bucket", choices=(BUCKET_WEEK, BUCKET_SPRINT, BUCKET_MONTH),
+                        help="Adds the aggregation series per week, sprint or month of the commit date")
+    parser.add_argument("--sprint-days", dest="sprint_days", type=int, default=SPRINT_DAYS,
+                        help="A number of days in a sprint for the sprint buckets")
+    parser.add_argument("--sprint-start", dest="sprint_start", default=SPRINT_START,
+                        help="The date the sprints are counted from in the YYYY-MM-DD format")
+    parser.add_argument("--format", dest="format", choices=tuple(WRITERS), default=FORMAT_TABLE,
+                        help="The output format: tables printed at the end (default), or commits streamed as they "
+                             "are gauged followed by the aggregations")
+    parser.add_argument("--engine", dest="engine", choices=(ENGINE_LOG, ENGINE_STATS), default=ENGINE_LOG,
+                        help="The way to collect changed files: a single streamed git log (default) or a git diff "
+                             "per commit")
+    timings.add_arguments(parser)
+    args = parser.parse_args(argv)
     try:
-        repo = Repo.clone_from(args.repo_url, PATH_REPO, branch=BRANCH_MAIN)
-    except:
-        print('Cannot clone the repository at URL: "%s"' % args.repo_url)
-        exit(os.EX_IOERR)
-
-    gauged_commits = gauge(
-        list(repo.iter_commits('--all', since='%d.days.ago' % args.days)),
-        {
-            "exclude": args.exclude_path,
-            "integration": args.integration_path,
-            "e2e": args.e2e_path,
-        })
-
-    print_commits_report(gauged_commits, integration=args.integration_path, e2e=args.e2e_path)
-    print_aggregation_report(gauged_commits, integration=args.integration_path, e2e=args.e2e_path)
+        normalise(args)
+    except (AttributeError, OSError, yaml.YAMLError) as e:
+        print(e)
+        return os.EX_IOERR
+
+    with timings.recording(args.timings, args.profile):
+        writer = WRITERS[args.format](args.repositories, sys.stdout, args.breakdowns or ())
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            results = list(executor.map(lambda r: gauge_repository(r, args, writer), args.repositories))
+
+        status = os.EX_OK
+        total = Aggregator([SUITE_UNIT])
+        total_buckets = {}
+        for result in results:
+            if result["error"]:
+                status = os.EX_IOERR
+            else:
+                total.merge(result["aggregator"])
+                for key, bucket in result["buckets"].items():
+                    total_buckets.setdefault(key, Aggregator([SUITE_UNIT])).merge(bucket)
+            with timings.phase("write"):
+                writer.repository(result)
+
+        with timings.phase("write"):
+            if len(args.repositories) > 1:
+                writer.total(total, total_buckets)
+            writer.close()
+
+        return status
+
+
+if "__main__" == __name__:
+    sys.exit(main())
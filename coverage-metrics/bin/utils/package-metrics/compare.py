@@ -1,91 +1,486 @@
 #!/usr/bin/env python3
 
 from argparse import ArgumentParser
+from fnmatch import fnmatchcase
 import json
-from prettytable import PrettyTable
 import os
+import re
+import shutil
+import sys
+import tempfile
 
-COLOURS = {
-    "red": "\033[91m",
-    "green": "\033[92m",
-    "blue": "\033[94m",
-    "empty": "\x1b[0m",
-}
+# The shared toolkit package is next to the tool directories.
+PATH_UTILS = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if PATH_UTILS not in sys.path:
+    sys.path.insert(0, PATH_UTILS)
+from qa_toolkit import load, timings  # noqa: E402
+from qa_toolkit.core import Colour, highlight, lazy_import, require, split_list  # noqa: E402
+from qa_toolkit.timings import timed, timed_iter  # noqa: E402
+
+git = lazy_import("git")
+prettytable = lazy_import("prettytable")
+yaml = lazy_import("yaml")
+# The metrics compared for every package.
+METRICS = ("efferent", "afferent", "external")
+# The statuses of the compared packages.
+STATUS_NEW = "new"
+STATUS_REMOVED = "removed"
+STATUS_CHANGED = "changed"
+STATUS_UNCHANGED = "unchanged"
+# The output formats.
+FORMAT_TABLE = "table"
+FORMAT_JSON = "json"
+FORMAT_MARKDOWN = "markdown"
+# The size of the chunks the metrics files are read with.
+READ_CHUNK_SIZE = 65536
+# The size of the violations kept in memory until the end of the output, the rest are spooled to a temporary file.
+VIOLATIONS_SPOOL_SIZE = 65536
+# The attributes of the policy file.
+ATTR_RULES = "rules"
+ATTR_IGNORE = "ignore"
+ATTR_PACKAGES = "packages"
+ATTR_ABSOLUTE = "absolute"
+ATTR_RELATIVE = "relative"
+ATTR_ALLOW_NEW_CYCLES = "allow_new_cycles"
+# The metric of the dependency cycle violations.
+METRIC_CYCLE = "cycle"
+
+json_whitespace_regexp = re.compile(r"\s*")
 
 
 # Validates and normalises the CLI arguments.
 def normalise(args):
-    if not args.base_path or len(args.base_path) == 0:
-        raise "the --base parameter must not be empty"
+    if args.base_ref or args.target_ref:
+        if not args.base_ref or not args.target_ref:
+            raise ValueError("the --base-ref and --target-ref parameters must be set together")
+        if not args.repo_path or not args.go_module:
+            raise ValueError("the --path and --module parameters must be set for --base-ref and --target-ref")
+        if not args.go_module.endswith("/"):
+            args.go_module += "/"
+        args.skip = split_list(args.skip)
+        return
+
+    require(args.base_path, "base")
+    require(args.target_path, "target")
+
+
+# Calculates the package metrics of both refs straight from the git objects. The blobs unchanged between the refs are
+# parsed only once.
+@timed("fetch_metrics_at_refs")
+def fetch_metrics_at_refs(args):
+    # The metrics are calculated by spm.py next to this script.
+    spm = load("spm")
+    repo = git.Repo(args.repo_path, search_parent_directories=True)
+    skipped_dirs = list(spm.DIRS_TO_SKIP) + args.skip
+    blob_deps = {}
+    metrics = []
+    for ref in (args.base_ref, args.target_ref):
+        dependencies = spm.fetch_deps_at(repo, ref, args.repo_path, skipped_dirs, blob_deps)
+        packages = spm.group_deps(dependencies, args.go_module)
+        spm.add_graph_metrics(packages, spm.PackageGraph(dependencies, args.go_module), closure=False)
+        metrics.append(packages)
+
+    return metrics
+
+
+# Reads the {"package": {metrics}, ...} JSON file package by package, so only a single package is held in memory.
+def iter_metrics(path):
+    decoder = json.JSONDecoder()
+    with open(path, "r") as metrics_file:
+        buffer = metrics_file.read(READ_CHUNK_SIZE)
+        position = json_whitespace_regexp.match(buffer).end()
+        if buffer[position:position + 1] != "{":
+            raise ValueError('the metrics file "%s" must contain a JSON object' % path)
+        position += 1
+        delimiter = ""
+        while True:
+            try:
+                start = json_whitespace_regexp.match(buffer, position).end()
+                if buffer[start:start + 1] == "}":
+                    return
+                if buffer[start:start + len(delimiter)] != delimiter:
+                    raise ValueError('the metrics file "%s" is not a valid JSON object at "%s"' %
+                                     (path, buffer[start:start + 20]))
+                start = json_whitespace_regexp.match(buffer, start + len(delimiter)).end()
+                package, end = decoder.raw_decode(buffer, start)
+                end = json_whitespace_regexp.match(buffer, end).end()
+                if buffer[end:end + 1] != ":":
+                    raise ValueError('the metrics file "%s" has no value of the "%s" package' % (path, package))
+                metrics, end = decoder.raw_decode(buffer, json_whitespace_regexp.match(buffer, end + 1).end())
+            except ValueError:
+                # The package is not read completely yet, unless the file ends.
+                chunk = metrics_file.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    raise
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            yield package, metrics
+            buffer = buffer[end:]
+            position = 0
+            delimiter = ","
+
+
+# Returns the metrics of the file package by package in the order of the package names. The files written by spm.py
+# are sorted already and are streamed, the others are sorted in memory.
+def sorted_metrics(path):
+    previous = None
+    for package, _ in iter_metrics(path):
+        if previous is not None and package < previous:
+            return iter(sorted(iter_metrics(path)))
+        previous = package
+
+    return iter_metrics(path)
+
+
+# Joins the metrics sorted by the package names and returns the (package, base metrics, target metrics) tuples.
+# The metrics of a package missing on either side are None.
+def join_metrics(base, target):
+    base_item = next(base, None)
+    target_item = next(target, None)
+    while base_item or target_item:
+        if target_item is None or (base_item is not None and base_item[0] < target_item[0]):
+            yield base_item[0], base_item[1], None
+            base_item = next(base, None)
+        elif base_item is None or target_item[0] < base_item[0]:
+            yield target_item[0], None, target_item[1]
+            target_item = next(target, None)
+        else:
+            yield target_item[0], base_item[1], target_item[1]
+            base_item = next(base, None)
+            target_item = next(target, None)
+
+
+# Compares the metrics of the package. The removed packages are compared with no coupling at all.
+def compare_package(package, base_metrics, target_metrics):
+    if base_metrics is None:
+        status = STATUS_NEW
+    elif target_metrics is None:
+        status = STATUS_REMOVED
+    else:
+        status = STATUS_UNCHANGED
+
+    delta = {"package": package, "status": status}
+    for metric in METRICS:
+        base_value = base_metrics[metric] if base_metrics else 0
+        target_value = target_metrics[metric] if target_metrics else 0
+        delta[metric] = {"base": base_value, "target": target_value, "delta": target_value - base_value}
+        if status == STATUS_UNCHANGED and base_value != target_value:
+            status = delta["status"] = STATUS_CHANGED
+
+    return delta
+
+
+# The allowed growth of the package metrics. Every rule applies to the packages matching any of its glob patterns, and
+# the first rule matching a package is used. The growth of a metric is allowed if it does not exceed either the
+# absolute or the relative (to the base value) allowance of the rule; a metric the rule sets to null may grow freely.
+# The metrics the rule leaves out, and the packages no rule matches, may not grow at all.
+# Only the packages present in both metrics are checked, and the ignored packages are not checked at all.
+class Policy:
+    def __init__(self, rules, ignore=(), allow_new_cycles=False):
+        self.rules = rules
+        self.ignore = ignore
+        self.allow_new_cycles = allow_new_cycles
+
+    def is_ignored(self, package):
+        return any(fnmatchcase(package, pattern) for pattern in self.ignore)
+
+    def rule(self, package):
+        return next((r for r in self.rules if any(fnmatchcase(package, p) for p in r[ATTR_PACKAGES])), None)
+
+    # Returns the violations of the policy by the package delta.
+    def check(self, delta):
+        if delta["status"] != STATUS_CHANGED or self.is_ignored(delta["package"]):
+            return []
+
+        rule = self.rule(delta["package"]) or DEFAULT_RULE
+        violations = []
+        for metric in METRICS:
+            allowed = rule[metric] if metric in rule else DEFAULT_RULE[metric]
+            growth = delta[metric]["delta"]
+            if growth <= 0 or allowed is None:
+                continue
+            relative = growth / delta[metric]["base"] if delta[metric]["base"] else float("inf")
+            if ATTR_ABSOLUTE in allowed and growth <= allowed[ATTR_ABSOLUTE]:
+                continue
+            if ATTR_RELATIVE in allowed and relative <= allowed[ATTR_RELATIVE]:
+                continue
+            violations.append({"package": delta["package"], "metric": metric, "base": delta[metric]["base"],
+                               "target": delta[metric]["target"], "delta": growth, "allowed": allowed,
+                               "rule": rule[ATTR_PACKAGES]})
+
+        return violations
+
+    # Returns the violations of the policy by the new dependency cycles.
+    def check_cycles(self, cycles):
+        if self.allow_new_cycles:
+            return []
+
+        return [{"package": cycle[0], "metric": METRIC_CYCLE, "cycle": list(cycle)} for cycle in cycles
+                if not all(self.is_ignored(package) for package in cycle)]
+
+
+# The policy without a policy file: no metric of a package may grow and no new cycle may appear. Its rule applies to the
+# packages and the metrics a policy file has no rule for.
+DEFAULT_RULE = {ATTR_PACKAGES: ["*"], **{metric: {ATTR_ABSOLUTE: 0} for metric in METRICS}}
+DEFAULT_POLICY = Policy([DEFAULT_RULE])
+
+
+# Reads the YAML policy file.
+@timed("read_policy")
+def read_policy(path):
+    with open(path, "r") as policy_file:
+        policy = yaml.safe_load(policy_file) or {}
+
+    unknown = set(policy) - {ATTR_RULES, ATTR_IGNORE, ATTR_ALLOW_NEW_CYCLES}
+    if unknown:
+        raise AttributeError('The policy is malformed. Unknown attributes: "%s".' % '", "'.join(sorted(unknown)))
+
+    rules = policy.get(ATTR_RULES) or []
+    for rule in rules:
+        if ATTR_PACKAGES not in rule:
+            raise AttributeError('The policy is malformed. A rule has no "%s" attribute.' % ATTR_PACKAGES)
+        if isinstance(rule[ATTR_PACKAGES], str):
+            rule[ATTR_PACKAGES] = [rule[ATTR_PACKAGES]]
+        unknown = set(rule) - {ATTR_PACKAGES} - set(METRICS)
+        if unknown:
+            raise AttributeError('The policy is malformed. The "%s" rule has unknown attributes "%s", the metrics are '
+                                 '"%s".' % (", ".join(rule[ATTR_PACKAGES]), '", "'.join(sorted(unknown)),
+                                            '", "'.join(METRICS)))
+        for metric in METRICS:
+            allowed = rule.get(metric)
+            if allowed is not None and (not isinstance(allowed, dict) or not allowed or
+                                        not set(allowed) <= {ATTR_ABSOLUTE, ATTR_RELATIVE}):
+                raise AttributeError('The policy is malformed. The "%s" allowance of the "%s" rule must have the '
+                                     '"%s" or "%s" attributes only.' %
+                                     (metric, ", ".join(rule[ATTR_PACKAGES]), ATTR_ABSOLUTE, ATTR_RELATIVE))
+
+    ignore = policy.get(ATTR_IGNORE) or []
+    return Policy(rules, [ignore] if isinstance(ignore, str) else ignore, bool(policy.get(ATTR_ALLOW_NEW_CYCLES)))
+
 
-    if not args.target_path or len(args.target_path) == 0:
-        raise "the --target parameter must not be empty"
+# Returns the dependency cycles of the target metrics that are not a part of any cycle of the base metrics.
+# The cycles are known only for the metrics calculated with the spm.py --cycles parameter.
+def new_cycles(base_cycles, target_cycles):
+    base_cycles = [set(c) for c in base_cycles]
+    return sorted(c for c in set(target_cycles) if not any(set(c) <= b for b in base_cycles))
 
 
-# Highlights the text with a specified colour.
-def highlight(text, colour):
-    return f'{colour}{text}{COLOURS["empty"]}'
+# Returns the file the violations are written to as they are found and copied from to the output after the packages.
+# Only the first VIOLATIONS_SPOOL_SIZE characters are kept in memory.
+def violations_spool():
+    return tempfile.SpooledTemporaryFile(max_size=VIOLATIONS_SPOOL_SIZE, mode="w+")
+
+
+# Copies the violations to the output and removes them.
+def copy_spool(spool, out):
+    spool.seek(0)
+    shutil.copyfileobj(spool, out)
+    spool.close()
+
+
+# Prints the package deltas as a table coloured for a terminal.
+class TableWriter:
+    def __init__(self, out):
+        self.out = out
+        self.table = prettytable.PrettyTable(("Package",) + tuple(m.capitalize() for m in METRICS))
+        self.table.align["Package"] = "l"
+        for metric in METRICS:
+            self.table.align[metric.capitalize()] = "r"
+        self.violations = prettytable.PrettyTable(("Package", "Metric", "Base", "Target", "Allowed growth"))
+        self.violations.align["Package"] = "l"
+
+    def package(self, delta):
+        is_new = delta["status"] == STATUS_NEW
+        label = delta["package"] + (" (removed)" if delta["status"] == STATUS_REMOVED else "")
+        self.table.add_row([label] + ["%d%s" % (delta[m]["target"], highlight_delta(
+            " %+d" % delta[m]["delta"] if delta[m]["delta"] != 0 else "", delta[m]["delta"], is_new=is_new))
+            for m in METRICS])
+
+    def violation(self, v):
+        package = ", ".join(v["cycle"]) if v["metric"] == METRIC_CYCLE else v["package"]
+        self.violations.add_row((package, v["metric"], v.get("base", ""), v.get("target", ""),
+                                 format_allowed(v.get("allowed"))))
+
+    def close(self, cycles):
+        print(self.table, file=self.out)
+        if cycles:
+            print(highlight("New dependency cycles:", Colour.RED), file=self.out)
+            for cycle in cycles:
+                print("  " + ", ".join(cycle), file=self.out)
+        if self.violations.rows:
+            print(highlight("Policy violations:", Colour.RED), file=self.out)
+            print(self.violations, file=self.out)
+
+
+# Writes the package deltas as a markdown table for a pull request comment, row by row.
+class MarkdownWriter:
+    def __init__(self, out):
+        self.out = out
+        self.rows = 0
+        self.violations = violations_spool()
+        self.violation_count = 0
+
+    def package(self, delta):
+        if not self.rows:
+            self.out.write("| Package | %s |\n|:--|%s\n" % (" | ".join(m.capitalize() for m in METRICS),
+                                                            "--:|" * len(METRICS)))
+        status = " **%s**" % delta["status"] if delta["status"] in (STATUS_NEW, STATUS_REMOVED) else ""
+        self.out.write("| `%s`%s | %s |\n" % (delta["package"], status, " | ".join(
+            "%d (%+d)" % (delta[m]["target"], delta[m]["delta"]) if delta[m]["delta"] else "%d" % delta[m]["target"]
+            for m in METRICS)))
+        self.rows += 1
+
+    def violation(self, v):
+        if v["metric"] == METRIC_CYCLE:
+            self.violations.write("- a new dependency cycle of %s\n" % ", ".join("`%s`" % p for p in v["cycle"]))
+        else:
+            self.violations.write("- `%s`: %s %d -> %d, allowed growth %s\n" %
+                                  (v["package"], v["metric"], v["base"], v["target"], format_allowed(v["allowed"])))
+        self.violation_count += 1
+
+    def close(self, cycles):
+        if not self.rows:
+            self.out.write("No package metrics changed.\n")
+        if cycles:
+            self.out.write("\n**New dependency cycles:**\n\n")
+            for cycle in cycles:
+                self.out.write("- %s\n" % ", ".join("`%s`" % p for p in cycle))
+        if self.violation_count:
+            self.out.write("\n**Policy violations:**\n\n")
+        copy_spool(self.violations, self.out)
+
+
+# Writes a single JSON document of the {"packages": [...], "new_cycles": [...], "violations": [...]} form package by
+# package.
+class JsonWriter:
+    def __init__(self, out):
+        self.out = out
+        self.rows = 0
+        self.violations = violations_spool()
+        self.violation_count = 0
+        self.out.write('{"packages": [')
+
+    def package(self, delta):
+        self.out.write((",\n" if self.rows else "\n") + json.dumps(delta))
+        self.rows += 1
+
+    def violation(self, v):
+        self.violations.write((", " if self.violation_count else "") + json.dumps(v))
+        self.violation_count += 1
+
+    def close(self, cycles):
+        self.out.write('\n], "new_cycles": %s, "violations": [' % json.dumps(cycles))
+        copy_spool(self.violations, self.out)
+        self.out.write("]}\n")
+
+
+WRITERS = {
+    FORMAT_TABLE: TableWriter,
+    FORMAT_JSON: JsonWriter,
+    FORMAT_MARKDOWN: MarkdownWriter,
+}
+
+
+# Compares the metrics sorted by the package names and checks them against the policy in a single pass, and writes the
+# deltas and the violations as they are found. Returns the exit status: EX_DATAERR if the policy is violated.
+@timed("compare")
+def compare(base, target, writer, changed_only=False, policy=DEFAULT_POLICY):
+    violations = 0
+    base_cycles = []
+    target_cycles = []
+    for package, base_metrics, target_metrics in join_metrics(base, target):
+        if base_metrics and "cycle_packages" in base_metrics:
+            base_cycles.append(tuple(base_metrics["cycle_packages"]))
+        if target_metrics and "cycle_packages" in target_metrics:
+            target_cycles.append(tuple(target_metrics["cycle_packages"]))
+
+        delta = compare_package(package, base_metrics, target_metrics)
+        if not changed_only or delta["status"] != STATUS_UNCHANGED:
+            writer.package(delta)
+        for violation in policy.check(delta):
+            writer.violation(violation)
+            violations += 1
+
+    cycles = new_cycles(base_cycles, target_cycles)
+    for violation in policy.check_cycles(cycles):
+        writer.violation(violation)
+        violations += 1
+    writer.close(cycles)
+
+    return os.EX_DATAERR if violations else os.EX_OK
+
+
+# Formats the allowed growth of a metric.
+def format_allowed(allowed):
+    if not allowed:
+        return ""
+
+    limits = []
+    if ATTR_ABSOLUTE in allowed:
+        limits.append("+%s" % allowed[ATTR_ABSOLUTE])
+    if ATTR_RELATIVE in allowed:
+        limits.append("+%s%%" % round(allowed[ATTR_RELATIVE] * 100, 2))
+    return " or ".join(limits)
 
 
 # Highlights the keywords in the input.
 def highlight_delta(string, delta, is_new=False):
     if is_new:
-        return highlight(string, COLOURS['blue'])
+        return highlight(string, Colour.BLUE)
 
     if delta > 0:
-        return highlight(string, COLOURS['red'])
+        return highlight(string, Colour.RED)
 
     if delta < 0:
-        return highlight(string, COLOURS['green'])
+        return highlight(string, Colour.GREEN)
 
     return string
 
 
-if "__main__" == __name__:
+def main(argv=None):
     parser = ArgumentParser()
     parser.add_argument("-b", "--base", dest="base_path", help="A path to the json file with a base metrics")
     parser.add_argument("-t", "--target", dest="target_path", help="A path to the json file with a target metrics")
+    parser.add_argument("--base-ref", dest="base_ref",
+                        help="A git ref to calculate the base metrics at, instead of reading the --base file")
+    parser.add_argument("--target-ref", dest="target_ref",
+                        help="A git ref to calculate the target metrics at, instead of reading the --target file")
+    parser.add_argument("-p", "--path", dest="repo_path", help="A path to the Go project's source code for the refs")
+    parser.add_argument("-m", "--module", dest="go_module", help="Fully qualified go module name for the refs")
+    parser.add_argument("-s", "--skip", dest="skip",
+                        help="A comma-separated list of directories to be skipped for the refs")
 
-    args = parser.parse_args()
-    normalise(args)
-
-    # Read the file contents
-    with open(args.base_path, "r") as base_file:
-        base = json.load(base_file)
-    with open(args.target_path, "r") as target_file:
-        target = json.load(target_file)
-
-    base = dict(sorted(base.items()))
-    target = dict(sorted(target.items()))
+    parser.add_argument("--changed-only", dest="changed_only", action="store_true",
+                        help="Shows only the new, removed and changed packages")
+    parser.add_argument("--policy", dest="policy",
+                        help="A path to the YAML policy of the allowed metric growth (no growth is allowed by default)")
+    parser.add_argument("-f", "--format", dest="format", choices=WRITERS.keys(), default=FORMAT_TABLE,
+                        help="An output format: a table, a JSON document or a markdown table for a pull request")
+    timings.add_arguments(parser)
 
-    table = PrettyTable(("Package", "Efferent", "Afferent", "External"))
-
-    status = os.EX_OK
-    for pkg, pkg_metrics in target.items():
-        is_new = pkg not in base
-
-        delta_efferent = pkg_metrics["efferent"] - base.get(pkg, {}).get("efferent", 0)
-        delta_afferent = pkg_metrics["afferent"] - base.get(pkg, {}).get("afferent", 0)
-        delta_external = pkg_metrics["external"] - base.get(pkg, {}).get("external", 0)
+    args = parser.parse_args(argv)
+    normalise(args)
 
-        efferent_label = " %+d" % delta_efferent if delta_efferent != 0 else ""
-        afferent_label = " %+d" % delta_afferent if delta_afferent != 0 else ""
-        external_label = " %+d" % delta_external if delta_external != 0 else ""
+    with timings.recording(args.timings, args.profile):
+        # The policy is read first, so a malformed one is reported before any metrics are calculated.
+        try:
+            policy = read_policy(args.policy) if args.policy else DEFAULT_POLICY
+        except (AttributeError, FileNotFoundError) as e:
+            print(e)
+            return os.EX_IOERR
 
-        if not is_new and any(delta > 0 for delta in [delta_efferent, delta_afferent, delta_external]):
-            status = os.EX_DATAERR
+        if args.base_ref:
+            base, target = fetch_metrics_at_refs(args)
+            base, target = iter(sorted(base.items())), iter(sorted(target.items()))
+        else:
+            # The metrics files are read while they are compared, so the reading is timed per package.
+            base = timed_iter("read_metrics", sorted_metrics(args.base_path))
+            target = timed_iter("read_metrics", sorted_metrics(args.target_path))
 
-        table.add_row(
-            (pkg,
-             "%d%s" % (pkg_metrics["efferent"], highlight_delta(efferent_label, delta_efferent, is_new=is_new)),
-             "%d%s" % (pkg_metrics["afferent"], highlight_delta(afferent_label, delta_afferent, is_new=is_new)),
-             "%d%s" % (pkg_metrics["external"], highlight_delta(external_label, delta_external, is_new=is_new)),
-             ))
+        return compare(base, target, WRITERS[args.format](sys.stdout), args.changed_only, policy)
 
-    table.align["Package"] = "l"
-    table.align["Efferent"] = "r"
-    table.align["Afferent"] = "r"
-    table.align["External"] = "r"
-    print(table)
 
-    exit(status)
+if "__main__" == __name__:
+    sys.exit(main())
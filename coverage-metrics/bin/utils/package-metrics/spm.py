@@ -1,114 +1,649 @@
 #!/usr/bin/env python3
 
 from argparse import ArgumentParser
-from git import Repo
 import json
 import os
 import re
+import sys
+
+# The shared toolkit package is next to the tool directories.
+PATH_UTILS = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if PATH_UTILS not in sys.path:
+    sys.path.insert(0, PATH_UTILS)
+from qa_toolkit import timings  # noqa: E402
+from qa_toolkit.core import lazy_import, require, split_list  # noqa: E402
+from qa_toolkit.timings import timed  # noqa: E402
+
+futures = lazy_import("concurrent.futures")
+git = lazy_import("git")
+saxutils = lazy_import("xml.sax.saxutils")
 
 DIRS_TO_SKIP = (".", "config", "tests")  # The list of directories to skip metric calculation
 GO_TEST_SUFFIX = "_test.go"
 GO_SUFFIX = ".go"
-
-# The regular expression to match an import section content inside a go file (https://regex101.com/r/JW2UD0/1).
-go_imports_regexp = re.compile(r"import \((.*?)\)|import (\".*?\")", flags=re.MULTILINE | re.DOTALL)
+# The size of the chunks a go file header is read with.
+HEADER_CHUNK_SIZE = 4096
+# The version of the import cache format.
+CACHE_VERSION = 2
+# The number of files a worker process scans at once.
+SCAN_CHUNK_SIZE = 64
+# The formats the package dependency graph can be written in.
+GRAPH_FORMATS = ("dot", "graphml")
+
+# The prefix of the build constraint comment.
+GO_BUILD_PREFIX = "//go:build"
+# The defaults of the build context when files are filtered by the build constraints.
+GOOS = "linux"
+GOARCH = "amd64"
+# The operating systems and architectures the file name suffixes constrain the files to
+# (https://pkg.go.dev/go/build#hdr-Build_Constraints).
+KNOWN_GOOS = ("aix", "android", "darwin", "dragonfly", "freebsd", "hurd", "illumos", "ios", "js", "linux", "nacl",
+              "netbsd", "openbsd", "plan9", "solaris", "wasip1", "windows", "zos")
+KNOWN_GOARCH = ("386", "amd64", "amd64p32", "arm", "armbe", "arm64", "arm64be", "loong64", "mips", "mipsle", "mips64",
+                "mips64le", "mips64p32", "mips64p32le", "ppc", "ppc64", "ppc64le", "riscv", "riscv64", "s390",
+                "s390x", "sparc", "sparc64", "wasm")
+UNIX_GOOS = ("aix", "android", "darwin", "dragonfly", "freebsd", "hurd", "illumos", "ios", "linux", "netbsd", "openbsd",
+             "solaris")
+# The operating systems implied by another one, e.g. android files are built with the linux ones.
+IMPLIED_GOOS = {"android": "linux", "illumos": "solaris", "ios": "darwin"}
+
+# The regular expressions of the go source elements the package clause and the import declarations consist of.
+# They are unrolled so that every text can be matched in one way only, so a mismatch never backtracks exponentially and
+# a comment is never matched partially.
+GO_BLOCK_COMMENT = r"/\*[^*]*\*+(?:[^/*][^*]*\*+)*/"
+GO_COMMENT = r"//[^\n]*(?![^\n])|" + GO_BLOCK_COMMENT
+GO_STRING = r"\"[^\"\\\n]*(?:\\.[^\"\\\n]*)*\"|`[^`]*`"
+GO_SPACE = r"\s*(?:(?:%s)\s*)*" % GO_COMMENT
+# The comments and semicolons between the declarations, always matched atomically.
+GO_SKIP = r"\s*(?:(?://[^\n]*|%s|;)\s*)*" % GO_BLOCK_COMMENT
+# The content of an import group up to its closing parenthesis.
+GO_GROUP = r"[^)\"`/]*(?:(?:%s|%s|/(?![/*]))[^)\"`/]*)*" % (GO_STRING, GO_COMMENT)
+GO_IMPORT = r"import%(space)s(?:(?:[\w.]+%(space)s)?(?:%(string)s)|\(%(group)s\))" % {
+    "space": GO_SPACE, "string": GO_STRING, "group": GO_GROUP}
+# The regular expression to match the go file header in a single pass: the comments preceding the package clause, the
+# package clause and all the import declarations following it. The comments are matched atomically (by a lookahead and
+# a backreference), so they are not given back comment by comment on a mismatch.
+go_header_regexp = re.compile(r"(?=(?P<comments>%(skip)s))(?P=comments)package%(space)s\w+"
+                              r"(?P<imports>(?:(?=(?P<skip>%(skip)s))(?P=skip)%(import)s)*)"
+                              % {"skip": GO_SKIP, "space": GO_SPACE, "import": GO_IMPORT})
+# The regular expression to find the import paths in the import declarations, skipping the commented out ones.
+go_import_path_regexp = re.compile(r"%s|(%s)" % (GO_COMMENT, GO_STRING))
+# The regular expressions to find the build constraint in the comments preceding the package clause. The first one
+# looks for the constraint line only (in the comments prefixed with a new line), the second one also skips the block
+# comments, which may contain such a line.
+go_build_line_regexp = re.compile(r"\n//go:build\b([^\n]*)")
+go_build_regexp = re.compile(r"/\*.*?(?:\*/|\Z)|^//go:build\b([^\n]*)", flags=re.MULTILINE | re.DOTALL)
+# The regular expression to split a build constraint expression into tokens.
+go_build_token_regexp = re.compile(r"\s*(\|\||&&|!|\(|\)|[\w.]+)")
 
 
 def trim_prefix(text, prefix):
     return text[len(prefix):] if text.startswith(prefix) else text
 
 
+def trim_suffix(text, suffix):
+    return text[:-len(suffix)] if suffix and text.endswith(suffix) else text
+
+
+# The regular expression to match comments and the top-level declarations that can only follow the import declarations
+# in a go file. An unterminated block comment matches till the end of the text read so far.
+go_header_end_regexp = re.compile(r"//[^\n]*|/\*(?:.*?\*/|.*\Z)|^(?:func|type|var|const)\b",
+                                  flags=re.MULTILINE | re.DOTALL)
+
+
+# Parses the package clause and the import declarations of the go file. They are matched at once, since the imports
+# must precede all the other declarations, and the import paths are the only string literals among them. Returns the
+# list of the imported packages and the //go:build constraint expression (or None).
+def parse_go_file(file_contents):
+    match = go_header_regexp.match(file_contents)
+    if not match:
+        return [], None
+
+    comments, declarations = match.group("comments", "imports")
+    build = find_build(comments) if GO_BUILD_PREFIX in comments else None
+    # Most declarations have neither comments nor escaped or raw strings, so splitting them by the quotes is enough.
+    if "//" not in declarations and "/*" not in declarations and "`" not in declarations and "\\" not in declarations:
+        return declarations.split('"')[1::2], build
+
+    return [path[1:-1] for path in go_import_path_regexp.findall(declarations) if path], build
+
+
+# Returns the //go:build constraint expression found in the comments, or None.
+def find_build(comments):
+    match = go_build_line_regexp.search("\n" + comments)
+    if match and "/*" in comments[:match.start()]:
+        match = next((m for m in go_build_regexp.finditer(comments) if m.group(1) is not None), None)
+
+    return match.group(1).strip() if match else None
+
+
 # Extracts the list of dependencies from the go file content.
 def extract_deps(file_contents):
-    imports_match = go_imports_regexp.search(file_contents)
-    if not imports_match:
-        return []
+    return list(set(parse_go_file(file_contents)[0]))
+
+
+# The operating system, the architecture and the tags to select the build-constrained go files with.
+class BuildContext:
+    def __init__(self, goos=GOOS, goarch=GOARCH, tags=()):
+        self.goos = goos
+        self.goarch = goarch
+        self.tags = {goos, goarch, "gc"} | set(tags)
+        if goos in IMPLIED_GOOS:
+            self.tags.add(IMPLIED_GOOS[goos])
+        if goos in UNIX_GOOS:
+            self.tags.add("unix")
+
+    def has_tag(self, tag):
+        # All the go release tags are satisfied.
+        return tag in self.tags or re.fullmatch(r"go1\.\d+", tag) is not None
+
+    # Matches the _GOOS, _GOARCH and _GOOS_GOARCH suffixes of the file name.
+    def matches_name(self, file_name):
+        name = trim_suffix(trim_suffix(os.path.basename(file_name), GO_SUFFIX), "_test")
+        if "_" not in name:
+            return True
+
+        parts = name[name.index("_") + 1:].split("_")
+        if len(parts) >= 2 and parts[-2] in KNOWN_GOOS and parts[-1] in KNOWN_GOARCH:
+            return self.has_tag(parts[-2]) and parts[-1] == self.goarch
+        if parts[-1] in KNOWN_GOOS:
+            return self.has_tag(parts[-1])
+        if parts[-1] in KNOWN_GOARCH:
+            return parts[-1] == self.goarch
+
+        return True
+
+    # Evaluates the //go:build constraint expression.
+    def matches_build(self, build):
+        if not build:
+            return True
+
+        tokens = go_build_token_regexp.findall(build)
+        position = 0
+
+        def parse_or():
+            nonlocal position
+            result = parse_and()
+            while position < len(tokens) and tokens[position] == "||":
+                position += 1
+                result = parse_and() or result
+            return result
+
+        def parse_and():
+            nonlocal position
+            result = parse_not()
+            while position < len(tokens) and tokens[position] == "&&":
+                position += 1
+                result = parse_not() and result
+            return result
+
+        def parse_not():
+            nonlocal position
+            token = tokens[position] if position < len(tokens) else ""
+            position += 1
+            if token == "!":
+                return not parse_not()
+            if token == "(":
+                result = parse_or()
+                position += 1
+                return result
+            return self.has_tag(token)
+
+        return parse_or()
+
+    def matches(self, file_name, build):
+        return self.matches_name(file_name) and self.matches_build(build)
+
+
+# Returns the end of the go file header in the text read so far: the position of the first top-level declaration,
+# which ends the package clause and the import declarations, or None if there is none yet.
+def find_header_end(text):
+    for match in go_header_end_regexp.finditer(text):
+        if not match.group().startswith("/"):
+            return match.start()
+
+    return None
+
+
+# Reads the go file up to its first top-level declaration.
+# The file is read in chunks until a declaration outside of comments is found, so the rest of the file is never read.
+def read_header(file_path):
+    with open(file_path, "r") as file:
+        header = file.read(HEADER_CHUNK_SIZE)
+        while True:
+            end = find_header_end(header)
+            if end is not None:
+                return header[:end]
+
+            chunk = file.read(HEADER_CHUNK_SIZE)
+            if not chunk:
+                return header
+            header += chunk
+
+
+# Extracts the list of dependencies and the build constraint from the go file header.
+def scan_file(file_path):
+    imports, build = parse_go_file(read_header(file_path))
+    return list(set(imports)), build
+
+
+# The on-disk cache of the dependencies of go files keyed by the git blob SHA of the file, or by its path, modification
+# time and size when the file is not tracked or has local modifications. Only the entries used by the last full run are
+# saved, so the cache does not outgrow the source tree; an incremental run keeps the entries of the files it has not
+# scanned.
+class ImportCache:
+    def __init__(self, path, repo):
+        self.path = path
+        self.repo = repo
+        self.blobs = None
+        self.entries = {}
+        self.used = {}
+        if os.path.exists(path):
+            with open(path, "r") as cache_file:
+                cache = json.load(cache_file)
+            if cache.get("version") == CACHE_VERSION:
+                self.entries = cache["files"]
+
+    # Returns the cache key of the go file.
+    def key(self, file_path):
+        if self.blobs is None:
+            self.blobs = tracked_blobs(self.repo)
+        file_path = os.path.realpath(file_path)
+        if file_path in self.blobs:
+            return self.blobs[file_path]
+        stat = os.stat(file_path)
+        return "%s:%d:%d" % (file_path, stat.st_mtime_ns, stat.st_size)
+
+    def get(self, key):
+        if key in self.entries:
+            self.used[key] = self.entries[key]
+        return self.used.get(key)
+
+    def put(self, key, dependencies):
+        self.used[key] = dependencies
+
+    def save(self, prune=True):
+        files = self.used
+        if not prune:
+            # The entries keyed by the path of a file scanned again are outdated.
+            rescanned = {key.rsplit(":", 2)[0] for key in self.used if ":" in key}
+            files = {key: deps for key, deps in self.entries.items()
+                     if ":" not in key or key.rsplit(":", 2)[0] not in rescanned}
+            files.update(self.used)
+        with open(self.path, "w") as cache_file:
+            json.dump({"version": CACHE_VERSION, "files": files}, cache_file)
+
+
+# Returns the git blob SHAs of the tracked files without local modifications by their real paths.
+def tracked_blobs(repo):
+    root = os.path.realpath(repo.working_tree_dir)
+    blobs = {}
+    for entry in repo.git.ls_files("-s", "-z").split("\0"):
+        if entry:
+            meta, name = entry.split("\t", 1)
+            blobs[os.path.join(root, name)] = meta.split()[1]
+    for name in repo.git.ls_files("-m", "-z").split("\0"):
+        blobs.pop(os.path.join(root, name), None)
+
+    return blobs
+
+
+# Returns the dependencies and the build constraint of every go file, scanning only the files missing in the cache.
+# The files are scanned concurrently by the number of worker processes given by jobs, unless there are too few files
+# to outweigh the start of the processes.
+@timed("scan_files")
+def scan_files(file_paths, jobs=1, cache=None):
+    keys = [cache.key(f) for f in file_paths] if cache else [None] * len(file_paths)
+    file_deps = [cache.get(k) if cache else None for k in keys]
+
+    missing = [i for i, deps in enumerate(file_deps) if deps is None]
+    missing_paths = [file_paths[i] for i in missing]
+    if jobs > 1 and len(missing_paths) > jobs * SCAN_CHUNK_SIZE:
+        with futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            scanned = list(executor.map(scan_file, missing_paths, chunksize=SCAN_CHUNK_SIZE))
+    else:
+        scanned = [scan_file(f) for f in missing_paths]
 
-    # Normalise the imports section, weed out empty lines and comments.
-    raw_imports = imports_match.group(1) if imports_match.group(1) else imports_match.group(2)
-    imports = [i.strip() for i in raw_imports.split("\n")]
-    imports = [i for i in imports if len(i) > 0 and not i.startswith("//")]
+    for i, deps in zip(missing, scanned):
+        file_deps[i] = deps
+        if cache:
+            cache.put(keys[i], deps)
 
-    dependencies = []
-    for i in imports:
-        # Extract the imported package name only (without any aliases and quote characters).
-        dependencies.append(re.match(r'.*\"(.*)\".*', i)[1])
+    return file_deps
 
-    return list(set(dependencies))
 
+# Returns the non-test go files of the package directory.
+def package_go_files(directory, files):
+    return [os.path.join(directory, f) for f in files if not f.endswith(GO_TEST_SUFFIX) and f.endswith(GO_SUFFIX)]
+
+
+# Scans the go files of every package and returns the dict of the package dependencies.
+# With a build context only the files it selects are taken into account, and the packages without them are dropped.
+def scan_packages(package_files, jobs=1, cache=None, build_context=None):
+    file_deps = iter(scan_files([f for files in package_files.values() for f in files], jobs, cache))
 
-# Returns the dict of all go packages discovered under the given path.
-def fetch_deps(path, skipped_dirs):
     packages = {}
+    for package_name, files in package_files.items():
+        dependencies = None
+        for f in files:
+            deps, build = next(file_deps)
+            if build_context and not build_context.matches(f, build):
+                continue
+            dependencies = (dependencies or []) + deps
+        if dependencies is not None:
+            packages[package_name] = list(set(dependencies))
+
+    return packages
+
+
+def is_skipped(package_name, skipped_dirs):
+    return any(True for to_skip in skipped_dirs if package_name.startswith(to_skip))
+
+
+# Returns the dict of all go packages discovered under the given path.
+@timed("fetch_deps")
+def fetch_deps(path, skipped_dirs, jobs=1, cache=None, build_context=None):
+    package_files = {}
 
     for root, dirs, files in os.walk(path):
         package_name = trim_prefix(root, path)
 
         # Skip all unwanted directories.
-        if any(True for to_skip in skipped_dirs if package_name.startswith(to_skip)):
+        if is_skipped(package_name, skipped_dirs):
             continue
 
         # Fetch the list of go files in the directory excluding test ones.
-        go_files = [f for f in files if not f.endswith(GO_TEST_SUFFIX) and f.endswith(GO_SUFFIX)]
+        go_files = package_go_files(root, files)
         if len(go_files) == 0:
             continue
 
-        dependencies = []
-        for f in go_files:
-            file = open(os.path.join(root, f), "r")
-            dependencies += extract_deps(file.read())
+        package_files[package_name] = go_files
 
-        packages[package_name] = list(set(dependencies))
+    return scan_packages(package_files, jobs, cache, build_context)
+
+
+# Returns the dict of all go packages under the path at the git ref, read straight from the git objects without a
+# checkout. The dependencies of the blobs are looked up in and added to blob_deps, so the blobs shared by several refs
+# are parsed once.
+@timed("fetch_deps_at")
+def fetch_deps_at(repo, ref, path, skipped_dirs, blob_deps, build_context=None):
+    prefix = os.path.relpath(os.path.realpath(path), os.path.realpath(repo.working_tree_dir))
+    prefix = "" if prefix == "." else prefix + "/"
+
+    package_blobs = {}
+    for entry in repo.git.ls_tree("-r", "-z", ref, "--", prefix or ".").split("\0"):
+        if not entry:
+            continue
+        meta, name = entry.split("\t", 1)
+        _, object_type, sha = meta.split()
+        if object_type != "blob" or not name.endswith(GO_SUFFIX) or name.endswith(GO_TEST_SUFFIX):
+            continue
+
+        package_name = os.path.dirname(trim_prefix(name, prefix))
+        if not is_skipped(package_name, skipped_dirs):
+            package_blobs.setdefault(package_name, []).append((name, sha))
+
+    packages = {}
+    for package_name, blobs in package_blobs.items():
+        dependencies = None
+        for name, sha in blobs:
+            if sha not in blob_deps:
+                _, _, _, data = repo.git.get_object_data(sha)
+                text = data.decode("utf-8", errors="replace")
+                imports, build = parse_go_file(text[:find_header_end(text)])
+                blob_deps[sha] = (list(set(imports)), build)
+            deps, build = blob_deps[sha]
+            if build_context and not build_context.matches(name, build):
+                continue
+            dependencies = (dependencies or []) + deps
+        if dependencies is not None:
+            packages[package_name] = list(set(dependencies))
+
+    return packages
+
+
+# Restores the dependencies of the packages from the metrics JSON. The standard packages are not a part of the metrics,
+# but they do not affect them either.
+def restore_deps(metrics, module_name):
+    packages = {}
+    for package, package_metrics in metrics.items():
+        if "efferent_packages" not in package_metrics or "external_packages" not in package_metrics:
+            raise AttributeError('The metrics of the package "%s" have no dependency lists, they must be recomputed.'
+                                 % package)
+        packages[package] = [module_name + e for e in package_metrics["efferent_packages"]] + \
+                            package_metrics["external_packages"]
+
+    return packages
+
+
+# Updates the dependencies of the packages for the go files changed since the git ref, including the untracked ones.
+# Only the packages with changed files are scanned again, the ones left without go files are removed.
+@timed("update_deps")
+def update_deps(packages, repo, path, skipped_dirs, ref, jobs=1, cache=None, build_context=None):
+    root = os.path.realpath(repo.working_tree_dir)
+    path = os.path.realpath(path)
+    changed = repo.git.diff("--name-only", "-z", ref, "--", path).split("\0")
+    changed += repo.git.ls_files("--others", "--exclude-standard", "-z", "--", path).split("\0")
+
+    package_files = {}
+    for name in changed:
+        if not name.endswith(GO_SUFFIX) or name.endswith(GO_TEST_SUFFIX):
+            continue
+        directory = os.path.dirname(os.path.join(root, name))
+        package_name = os.path.relpath(directory, path) if directory != path else ""
+        if package_name in package_files or is_skipped(package_name, skipped_dirs):
+            continue
+
+        files = os.listdir(directory) if os.path.isdir(directory) else []
+        package_files[package_name] = package_go_files(directory, files)
+
+    packages = dict(packages)
+    for package_name in package_files:
+        packages.pop(package_name, None)
+    packages.update(scan_packages(package_files, jobs, cache, build_context))
 
     return packages
 
 
 # Groups the dependencies into efferent, afferent and external categories.
+# The importers of every package are indexed once, so the afferent coupling does not rescan all the import lists.
+@timed("group_deps")
 def group_deps(imported_packages, module_name):
+    importers = {}
+    for package, package_imports in imported_packages.items():
+        for i in package_imports:
+            importers.setdefault(i, set()).add(package)
+
     packages = {}
-    for package in imported_packages:
-        package_name = module_name + package
-        package_imports = imported_packages[package]
+    for package, package_imports in imported_packages.items():
+        # The list of all imported packages prefixed with a module_name.
+        efferent = sorted(set(trim_prefix(i, module_name) for i in package_imports if i.startswith(module_name)))
+        # The list of all packages that import a package_name.
+        afferent = sorted(importers.get(module_name + package, ()))
+        # The list of all external packages (the ones that contain a "." as a domain-name and "/"
+        # as a path separator to distinguish them for the standard packages).
+        external = sorted(set(i for i in package_imports if
+                              not i.startswith(module_name) and '/' in i and "." in i.split("/")[0]))
+        coupling = len(efferent) + len(afferent)
         packages[package] = {
-            # The list of all imported packages prefixed with a module_name.
-            "efferent": len([i for i in package_imports if i.startswith(module_name)]),
-            # The list of all packages that import a package_name.
-            "afferent": len([1 for p in imported_packages if package_name in imported_packages[p]]),
-            # The list of all external packages (the ones that contain a "." as a domain-name and "/"
-            # as a path separator to distinguish them for the standard packages).
-            "external": len(set([i for i in package_imports if
-                                 not i.startswith(module_name) and '/' in i and "." in i.split("/")[0]])),
+            "efferent": len(efferent),
+            "afferent": len(afferent),
+            "external": len(external),
+            # The instability Ce / (Ca + Ce), 0 for the packages without any coupling.
+            "instability": round(len(efferent) / coupling, 4) if coupling else 0,
+            "efferent_packages": efferent,
+            "afferent_packages": afferent,
+            "external_packages": external,
         }
 
     return packages
 
 
+# The dependency graph of the module packages. The packages are numbered in the order of their names and the imports
+# of every package are kept as a list of the numbers of the imported module packages.
+class PackageGraph:
+    def __init__(self, imported_packages, module_name):
+        names = set(imported_packages)
+        for package_imports in imported_packages.values():
+            names.update(trim_prefix(i, module_name) for i in package_imports if i.startswith(module_name))
+        self.names = sorted(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.edges = [[] for _ in self.names]
+        for package, package_imports in imported_packages.items():
+            self.edges[self.index[package]] = sorted(set(
+                self.index[trim_prefix(i, module_name)] for i in package_imports if i.startswith(module_name)))
+
+    # Returns the reversed edges: the numbers of the importers of every package.
+    def reversed_edges(self):
+        importers = [[] for _ in self.names]
+        for package, package_imports in enumerate(self.edges):
+            for i in package_imports:
+                importers[i].append(package)
+
+        return importers
+
+    # Returns the strongly connected components of the graph found by the Tarjan's algorithm in linear time, in the
+    # reverse topological order: no component imports the ones following it. The depth-first search keeps its own
+    # stack, so the depth of the graph is not limited by the recursion limit.
+    def components(self):
+        order = [None] * len(self.names)
+        low = [0] * len(self.names)
+        on_stack = [False] * len(self.names)
+        stack = []
+        components = []
+        counter = 0
+        for root in range(len(self.names)):
+            if order[root] is not None:
+                continue
+            order[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            path = [(root, iter(self.edges[root]))]
+            while path:
+                package, package_imports = path[-1]
+                for i in package_imports:
+                    if order[i] is None:
+                        order[i] = low[i] = counter
+                        counter += 1
+                        stack.append(i)
+                        on_stack[i] = True
+                        path.append((i, iter(self.edges[i])))
+                        break
+                    if on_stack[i]:
+                        low[package] = min(low[package], order[i])
+                else:
+                    path.pop()
+                    if path:
+                        low[path[-1][0]] = min(low[path[-1][0]], low[package])
+                    if low[package] == order[package]:
+                        component = []
+                        while True:
+                            i = stack.pop()
+                            on_stack[i] = False
+                            component.append(i)
+                            if i == package:
+                                break
+                        components.append(component)
+
+        return components
+
+    # Returns the sorted lists of the names of the packages importing each other, directly or transitively.
+    def cycles(self, components=None):
+        components = components if components is not None else self.components()
+        return sorted(sorted(self.names[i] for i in c) for c in components if len(c) > 1)
+
+    # Returns the numbers of the packages every package imports transitively and of the ones importing it transitively.
+    # The reachable packages are collected as bit sets once per strongly connected component, in the topological order
+    # of the components, so every edge is followed once.
+    def closure_sizes(self, components=None):
+        components = components if components is not None else self.components()
+        component_of = [0] * len(self.names)
+        for c, component in enumerate(components):
+            for i in component:
+                component_of[i] = c
+
+        def reachable(edges, ordered_components):
+            reach = [0] * len(components)
+            for c in ordered_components:
+                bits = 0
+                for i in components[c]:
+                    bits |= 1 << i
+                    for j in edges[i]:
+                        if component_of[j] != c:
+                            bits |= reach[component_of[j]]
+                reach[c] = bits
+            # The package itself is not counted.
+            return [bin(reach[component_of[i]]).count("1") - 1 for i in range(len(self.names))]
+
+        efferent = reachable(self.edges, range(len(components)))
+        afferent = reachable(self.reversed_edges(), reversed(range(len(components))))
+        return efferent, afferent
+
+    # Writes the graph in the DOT format, the packages in cycles are coloured red.
+    def write_dot(self, out, components=None):
+        in_cycle = set(i for c in (components or []) if len(c) > 1 for i in c)
+        out.write("digraph packages {\n")
+        for i, name in enumerate(self.names):
+            out.write("  %s%s;\n" % (json.dumps(name or "."), " [color=red]" if i in in_cycle else ""))
+        for i, package_imports in enumerate(self.edges):
+            for j in package_imports:
+                out.write("  %s -> %s;\n" % (json.dumps(self.names[i] or "."), json.dumps(self.names[j] or ".")))
+        out.write("}\n")
+
+    # Writes the graph in the GraphML format, with the number of the strongly connected component of every package.
+    def write_graphml(self, out, components=None):
+        component_of = {i: c for c, component in enumerate(components or []) for i in component}
+        escape = saxutils.escape
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                  '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                  '  <key id="name" for="node" attr.name="name" attr.type="string"/>\n'
+                  '  <key id="component" for="node" attr.name="component" attr.type="int"/>\n'
+                  '  <graph id="packages" edgedefault="directed">\n')
+        for i, name in enumerate(self.names):
+            out.write('    <node id="n%d"><data key="name">%s</data>' % (i, escape(name)))
+            if i in component_of:
+                out.write('<data key="component">%d</data>' % component_of[i])
+            out.write("</node>\n")
+        for i, package_imports in enumerate(self.edges):
+            for j in package_imports:
+                out.write('    <edge source="n%d" target="n%d"/>\n' % (i, j))
+        out.write("  </graph>\n</graphml>\n")
+
+
+# Adds the cycles and the transitive coupling of the dependency graph to the package metrics.
+@timed("graph_metrics")
+def add_graph_metrics(packages, graph, cycles=True, closure=True):
+    components = graph.components()
+    if cycles:
+        for cycle in graph.cycles(components):
+            for package in cycle:
+                if package in packages:
+                    packages[package]["cycle_packages"] = cycle
+    if closure:
+        efferent, afferent = graph.closure_sizes(components)
+        for package, package_metrics in packages.items():
+            package_metrics["transitive_efferent"] = efferent[graph.index[package]]
+            package_metrics["transitive_afferent"] = afferent[graph.index[package]]
+
+    return components
+
+
 # Validates and normalises the CLI arguments.
 def normalise(args):
-    if not args.go_module or len(args.go_module) == 0:
-        raise "the --module parameter must not be empty"
-
+    require(args.go_module, "module")
     if not args.go_module.endswith("/"):
         args.go_module += "/"
 
-    if not args.repo_path or len(args.repo_path) == 0:
-        raise "the --path parameter must not be empty"
+    require(args.repo_path, "path")
     if not args.repo_path.endswith("/"):
         args.repo_path += "/"
 
-    if not args.out or len(args.out) == 0:
-        raise "the --out parameter must not be empty"
-
-    if args.skip:
-        skip = args.skip.split(",")
-        skip = [s.trim() for s in skip]
-        skip = [s for s in skip if len(s) > 0]
-        args.skip = list(DIRS_TO_SKIP) + skip
-    else:
-        args.skip = list(DIRS_TO_SKIP)
+    require(args.out, "out")
+    args.skip = list(DIRS_TO_SKIP) + split_list(args.skip)
 
 
-if __name__ == "__main__":
+def main(argv=None):
     parser = ArgumentParser()
     parser.add_argument("-p", "--path", dest="repo_path", help="A path to the Go project's source code")
     parser.add_argument("-o", "--out", dest="out", help="A path to the resulting JSON file")
@@ -116,14 +651,67 @@ if __name__ == "__main__":
                         help="A comma-separated list of directories to be skipped for the analysis")
     parser.add_argument("-m", "--module", dest="go_module",
                         help="Fully qualified go module name (e.g.: github.com/kyma-project/lifecycle-manager)")
-
-    args = parser.parse_args()
+    parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=os.cpu_count(),
+                        help="A number of processes scanning the go files concurrently")
+    parser.add_argument("-c", "--cache", dest="cache",
+                        help="A path to the cache of the go file imports; only changed files are scanned")
+    parser.add_argument("--since", dest="since",
+                        help="A git ref to update the previous metrics from; only packages changed since are scanned")
+    parser.add_argument("--previous", dest="previous",
+                        help="A path to the previous metrics JSON file for --since (defaults to the --out file)")
+    parser.add_argument("--goos", dest="goos",
+                        help="Takes only the go files built for the operating system into account (e.g.: linux)")
+    parser.add_argument("--goarch", dest="goarch",
+                        help="Takes only the go files built for the architecture into account (e.g.: amd64)")
+    parser.add_argument("--tags", dest="tags", help="A comma-separated list of the build tags for --goos and --goarch")
+    parser.add_argument("--cycles", dest="cycles", action="store_true",
+                        help="Adds the packages of the dependency cycle every package is a part of to the metrics")
+    parser.add_argument("--closure", dest="closure", action="store_true",
+                        help="Adds the numbers of the transitively imported and importing packages to the metrics")
+    parser.add_argument("--graph", dest="graph", help="A path to write the package dependency graph to")
+    parser.add_argument("--graph-format", dest="graph_format", choices=GRAPH_FORMATS, default="dot",
+                        help="A format of the package dependency graph")
+    timings.add_arguments(parser)
+
+    args = parser.parse_args(argv)
     normalise(args)
 
-    repo = Repo(args.repo_path)
-    dependencies = fetch_deps(args.repo_path, args.skip)
-    grouped_dependencies = group_deps(dependencies, args.go_module)
-
-    out_file = open(args.out, "w")
-    json.dump(grouped_dependencies, out_file, indent=4)
-    out_file.close()
+    with timings.recording(args.timings, args.profile):
+        # The repository is needed only to key the cache and to find the changed files.
+        repo = git.Repo(args.repo_path, search_parent_directories=True) if args.cache or args.since else None
+        cache = ImportCache(args.cache, repo) if args.cache else None
+        build_context = None
+        if args.goos or args.goarch or args.tags:
+            build_context = BuildContext(args.goos or GOOS, args.goarch or GOARCH, split_list(args.tags))
+
+        if args.since:
+            with open(args.previous or args.out, "r") as previous_file:
+                previous = json.load(previous_file)
+            dependencies = update_deps(restore_deps(previous, args.go_module), repo, args.repo_path, args.skip,
+                                       args.since, args.jobs, cache, build_context)
+        else:
+            dependencies = fetch_deps(args.repo_path, args.skip, args.jobs, cache, build_context)
+        # Sort the packages, so full and incremental runs produce the same file.
+        grouped_dependencies = group_deps(dict(sorted(dependencies.items())), args.go_module)
+        if args.cycles or args.closure or args.graph:
+            with timings.phase("graph"):
+                graph = PackageGraph(dependencies, args.go_module)
+            components = add_graph_metrics(grouped_dependencies, graph, args.cycles, args.closure)
+            if args.graph:
+                with timings.phase("write_graph"), open(args.graph, "w") as graph_file:
+                    if args.graph_format == "graphml":
+                        graph.write_graphml(graph_file, components)
+                    else:
+                        graph.write_dot(graph_file, components)
+
+        if cache:
+            cache.save(prune=not args.since)
+
+        with timings.phase("write"):
+            out_file = open(args.out, "w")
+            json.dump(grouped_dependencies, out_file, indent=4)
+            out_file.close()
+
+
+if "__main__" == __name__:
+    sys.exit(main())
@@ -0,0 +1 @@
+from qa_toolkit.cli import load, run
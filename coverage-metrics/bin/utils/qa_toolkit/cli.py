@@ -0,0 +1,58 @@
+import importlib.util
+import os
+import sys
+
+from argparse import ArgumentParser, REMAINDER
+
+PATH_UTILS = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+# The module names and the script paths of the tools by their subcommands.
+TOOLS = {
+    "spm": ("spm", os.path.join("package-metrics", "spm.py")),
+    "compare": ("compare", os.path.join("package-metrics", "compare.py")),
+    "coverage": ("coverage_guard", os.path.join("unit-test-coverage", "coverage_guard.py")),
+    "gauge": ("gauge_sprint_commits", os.path.join("commit-test-suites", "gauge-sprint-commits.py")),
+    "highlight": ("highlighter", os.path.join("report-highlighter", "highlighter.py")),
+}
+
+
+# Loads the tool script as a module (the script names are not valid module names), once per process.
+# The module is registered and its directory is put on the module path, so its functions can be pickled for the worker
+# processes: the ones started by spawn or forkserver import the module by its name, the way spm.py's scan does (the
+# gauge script, whose name is not a module name, uses threads only).
+def load(command):
+    name, path = TOOLS[command]
+    if name in sys.modules:
+        return sys.modules[name]
+
+    directory = os.path.join(PATH_UTILS, os.path.dirname(path))
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(PATH_UTILS, path))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+
+# Runs the tool with the CLI arguments in the current process and returns its exit code, e.g. to chain the tools
+# without starting a new interpreter for every one.
+def run(command, argv=()):
+    try:
+        return load(command).main(list(argv)) or os.EX_OK
+    except SystemExit as e:
+        # The argument parser exits on --help and on invalid arguments.
+        return os.EX_OK if e.code is None else e.code
+
+
+# The qa-toolkit entry point: runs the tool of the subcommand with the rest of the arguments.
+def main(argv=None):
+    parser = ArgumentParser(prog="qa-toolkit")
+    parser.add_argument("command", choices=TOOLS, help="The tool to run")
+    parser.add_argument("args", nargs=REMAINDER, help="The arguments of the tool, see qa-toolkit <command> --help")
+    args = parser.parse_args(argv)
+
+    return run(args.command, args.args)
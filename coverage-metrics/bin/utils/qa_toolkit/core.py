@@ -0,0 +1,52 @@
+import importlib
+import sys
+
+
+class Colour:
+    RED = "\033[91m"
+    GREEN = "\033[92m"
+    BLUE = "\033[94m"
+    # Resets the colour to the default one
+    RESET = "\x1b[0m"
+    # Dims the current colour
+    DIM = '\033[2m'
+
+    @staticmethod
+    # Highlights the text with a specified colour.
+    def highlight(text, colour):
+        return highlight(text, colour)
+
+
+# Highlights the text with a specified colour.
+def highlight(text, colour):
+    return f'{colour}{text}{Colour.RESET}'
+
+
+# A module imported on the first access to any of its attributes, so a tool does not pay for importing the heavy
+# dependencies (git, prettytable, yaml) on the paths which do not use them.
+class LazyModule:
+    def __init__(self, name):
+        self._lazy_name = name
+        self._lazy_module = None
+
+    def __getattr__(self, attr):
+        if self._lazy_module is None:
+            # The import is thread safe and returns the same module to the concurrent callers.
+            self._lazy_module = importlib.import_module(self._lazy_name)
+        return getattr(self._lazy_module, attr)
+
+
+# Returns the module if it is imported already, or the module to be imported on its first use.
+def lazy_import(name):
+    return sys.modules.get(name) or LazyModule(name)
+
+
+# Splits the comma-separated list of the CLI parameter, the blank items are dropped.
+def split_list(value):
+    return [item.strip() for item in value.split(",") if item.strip()] if value else []
+
+
+# Ensures that the CLI parameter is set.
+def require(value, name):
+    if not value:
+        raise ValueError("the --%s parameter must not be empty" % name)
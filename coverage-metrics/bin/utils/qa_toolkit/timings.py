@@ -0,0 +1,187 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+from contextlib import contextmanager, nullcontext
+
+TIMINGS_VERSION = 1
+# The phase of the whole run.
+PHASE_TOTAL = "total"
+# The I/O counters of the current thread (Linux only).
+PATH_THREAD_IO = "/proc/thread-self/io"
+# The path to print the timings to the standard error instead of a file.
+STDERR = "-"
+
+# The recorder of the running tool, None unless its timings or its profile are requested.
+recorder = None
+null_phase = nullcontext()
+
+
+# Records the wall time, the CPU time of the thread, the subprocesses started and the bytes read by the thread per
+# phase. The phases of a thread nest: the time of a phase includes the time of the phases within it, and its self time
+# does not. The CPU time of the child processes is known only for the whole run, when they have been waited for.
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.phases = {}
+        self.started = time.perf_counter()
+        self.started_children = children_cpu_time()
+
+    # Returns the stack of the open phases of the current thread.
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+            self.local.subprocesses = 0
+        return self.local.stack
+
+    @contextmanager
+    def phase(self, name):
+        stack = self.stack()
+        # The wall time of the phases within this one.
+        frame = [0.0]
+        stack.append(frame)
+        subprocesses = self.local.subprocesses
+        bytes_read = read_bytes(True)
+        cpu = time.thread_time()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - started
+            cpu = time.thread_time() - cpu
+            bytes_read = read_bytes() - bytes_read if bytes_read is not None else 0
+            stack.pop()
+            if stack:
+                stack[-1][0] += wall
+            with self.lock:
+                totals = self.phases.setdefault(name, {"calls": 0, "wall": 0.0, "self": 0.0, "cpu": 0.0,
+                                                       "subprocesses": 0, "bytes_read": 0})
+                totals["calls"] += 1
+                totals["wall"] += wall
+                totals["self"] += wall - frame[0]
+                totals["cpu"] += cpu
+                totals["subprocesses"] += self.local.subprocesses - subprocesses
+                totals["bytes_read"] += bytes_read
+
+    # Counts the subprocess started by the current thread.
+    def count_subprocess(self):
+        self.stack()
+        self.local.subprocesses += 1
+
+    # Times every item the iterable produces, but not the processing of the item by the caller.
+    def iterate(self, name, iterable):
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def to_dict(self):
+        phases = {}
+        for name, totals in sorted(self.phases.items(), key=lambda p: -p[1]["wall"]):
+            phases[name] = {k: round(v, 6) if isinstance(v, float) else v for k, v in totals.items()}
+
+        return {"version": TIMINGS_VERSION, "wall": round(time.perf_counter() - self.started, 6),
+                "children_cpu": round(children_cpu_time() - self.started_children, 6), "phases": phases}
+
+
+# Returns the CPU time of the child processes waited for.
+def children_cpu_time():
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+# Returns the bytes read by the current thread, or None where the counters are not available. The counters read are
+# counted in too at the start of a phase, so a phase does not count the reads of the counters themselves.
+def read_bytes(is_start=False):
+    try:
+        with open(PATH_THREAD_IO, "rb") as io_file:
+            counters = io_file.read()
+    except OSError:
+        return None
+
+    rchar = int(counters.split(b"rchar:", 1)[1].split(b"\n", 1)[0])
+    return rchar + len(counters) if is_start else rchar
+
+
+# Counts the subprocesses of the recorded runs. An audit hook cannot be removed, so it is added once per process.
+def audit(event, args):
+    if event == "subprocess.Popen" and recorder:
+        recorder.count_subprocess()
+
+
+# Times the phase of the recorded run. Returns a shared no-op context otherwise, so the phases cost next to nothing.
+def phase(name):
+    return recorder.phase(name) if recorder else null_phase
+
+
+# Times every call of the decorated function as the phase.
+def timed(name):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def timed_fn(*args, **kwargs):
+            with phase(name):
+                return fn(*args, **kwargs)
+        return timed_fn
+    return decorate
+
+
+# Times every item the iterable produces as the phase, e.g. a stage of a generator pipeline.
+def timed_iter(name, iterable):
+    return recorder.iterate(name, iterable) if recorder else iterable
+
+
+# Adds the CLI parameters of the timings and the profile to the tool.
+def add_arguments(parser):
+    parser.add_argument("--timings", dest="timings",
+                        help="A path to write the JSON summary of the time spent per phase to (- for stderr)")
+    parser.add_argument("--profile", dest="profile", help="A path to write the cProfile statistics of the run to")
+
+
+# Records the timings and the profile of the run of the tool, if their paths are given, and writes them at its end.
+# The profile covers the main thread only.
+@contextmanager
+def recording(timings_path=None, profile_path=None):
+    global recorder
+    if not timings_path and not profile_path:
+        yield
+        return
+
+    if not getattr(audit, "added", False):
+        sys.addaudithook(audit)
+        audit.added = True
+
+    recorder = Recorder()
+    profiler = None
+    if profile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with recorder.phase(PHASE_TOTAL):
+            yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if timings_path:
+            write_timings(timings_path, recorder.to_dict())
+        recorder = None
+
+
+# Writes the timings as a JSON document.
+def write_timings(path, timings):
+    if path == STDERR:
+        json.dump(timings, sys.stderr, indent=4)
+        sys.stderr.write("\n")
+        return
+
+    with open(path, "w") as timings_file:
+        json.dump(timings, timings_file, indent=4)
@@ -1,13 +1,28 @@
 #!/usr/bin/env python3
 
+import hashlib
+import json
+import os
 import re
 import sys
-from urllib.request import urlopen
+import tempfile
+import time
 
-# Disable the certificate verification for the GitHub wiki page.
-import ssl
+from argparse import ArgumentParser
+from urllib.parse import urlparse
 
-ssl._create_default_https_context = ssl._create_unverified_context
+# The shared toolkit package is next to the tool directories.
+PATH_UTILS = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if PATH_UTILS not in sys.path:
+    sys.path.insert(0, PATH_UTILS)
+from qa_toolkit import timings  # noqa: E402
+from qa_toolkit.core import highlight, lazy_import  # noqa: E402
+from qa_toolkit.timings import timed  # noqa: E402
+
+# The HTTP client is imported only to download a glossary.
+ssl = lazy_import("ssl")
+urllib_error = lazy_import("urllib.error")
+urllib_request = lazy_import("urllib.request")
 
 COLOURS = {
     "red": "\x1b[6;30;41m",
@@ -20,17 +35,27 @@ COLOURS = {
     "empty": "\x1b[0m",
 }
 
-# The URL to the Markdown file with a list of keywords.
-TERMS_URL = ""
 TABLE_HEADER = "Term"
+# The key marking the end of a keyword in the keyword trie.
+TRIE_END = ""
+
+CACHE_VERSION = 1
+COMPILED_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "report-highlighter")
+DEFAULT_TIMEOUT = 10
+DEFAULT_RETRIES = 3
+RETRY_DELAY = 0.5
+HTTP_NOT_MODIFIED = 304
+REMOTE_SCHEMES = ("http", "https")
 
+terms_regexp = re.compile(r'\|(.*?)\|.*?\|')
+max_age_regexp = re.compile(r'\bmax-age\s*=\s*"?(\d+)')
 
-def read_keywords(url):
-    with urlopen(url) as response:
-        terms_response = str(response.read().decode('utf-8'))
 
+# Returns the terms of the glossary table in the Markdown file.
+def parse_terms(markdown):
     terms = []
-    for match in re.compile(r'\|(.*?)\|.*?\|').finditer(terms_response):
+    for match in terms_regexp.finditer(markdown):
         columns = match.group(1).split('|')
         term = columns[0].strip()
         is_table_header = len(term.replace("-", "")) == 0 or term == TABLE_HEADER
@@ -40,37 +65,226 @@ def read_keywords(url):
     return terms
 
 
-# Highlights the keywords in the input.
-def highlight_keywords(text, kwds):
-    for keyword in kwds:
-        text = text.replace(keyword, highlight(keyword, COLOURS['cyan']))
+# Reads the glossary terms from a local Markdown file or downloads them from the URL. The downloaded terms are cached
+# in the cache directory, if any, and are revalidated with the server once their max-age expires.
+@timed("read_keywords")
+def read_keywords(source, cache_dir=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, context=None):
+    url = urlparse(source)
+    if url.scheme in REMOTE_SCHEMES:
+        return fetch_keywords(source, cache_dir, timeout, retries, context)
 
-    return text
+    path = urllib_request.url2pathname(url.path) if url.scheme == "file" else source
+    with open(path, "r", encoding="utf-8") as glossary_file:
+        return parse_terms(glossary_file.read())
 
 
-# Highlights the text with a specified colour.
-def highlight(text, colour):
-    return f'{colour}{text}{COLOURS["empty"]}'
+# Downloads the glossary terms. The cached terms are used while they are fresh, and are revalidated with their ETag and
+# modification time afterwards, so an unchanged glossary is not downloaded again. The stale cached terms are used when
+# the server cannot be reached.
+def fetch_keywords(url, cache_dir, timeout, retries, context):
+    path = os.path.join(cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json") if cache_dir else None
+    cached = read_cache(path) if path else None
+    if cached and cached["expires"] > time.time():
+        return cached["terms"]
 
+    headers = {}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+    try:
+        request = urllib_request.Request(url, headers=headers)
+        status, response_headers, body = urlopen_with_retries(request, timeout, retries, context)
+    except OSError as e:
+        if not cached:
+            raise
+        print('Cannot fetch the glossary "%s", the cached one is used: %s' % (url, e), file=sys.stderr)
+        return cached["terms"]
 
-# Inserts empty lines between scenarios.
-def separate_scenarios(report):
-    lines = report.split("\n")
-    for i, line in enumerate(lines):
-        if not line.strip().startswith("When"):
-            continue
+    if status == HTTP_NOT_MODIFIED and cached:
+        terms = cached["terms"]
+    else:
+        charset = response_headers.get_content_charset() or "utf-8"
+        terms = parse_terms(body.decode(charset))
+    if path:
+        cached = cached or {}
+        write_cache(path, {"version": CACHE_VERSION, "url": url, "terms": terms,
+                           "etag": response_headers.get("ETag") or cached.get("etag"),
+                           "last_modified": response_headers.get("Last-Modified") or cached.get("last_modified"),
+                           "expires": time.time() + max_age(response_headers)})
+
+    return terms
+
+
+# Requests the URL and returns the status, the headers and the body of the response. The connection errors and the
+# server errors are retried with an exponential backoff; a "Not Modified" response is returned as it is.
+def urlopen_with_retries(request, timeout, retries, context):
+    for attempt in range(retries + 1):
+        try:
+            with urllib_request.urlopen(request, timeout=timeout, context=context) as response:
+                return response.status, response.headers, response.read()
+        except urllib_error.HTTPError as e:
+            if e.code == HTTP_NOT_MODIFIED:
+                return e.code, e.headers, b""
+            if e.code < 500 or attempt == retries:
+                raise
+        except OSError:
+            if attempt == retries:
+                raise
+        time.sleep(RETRY_DELAY * 2 ** attempt)
+
+
+# Returns the number of seconds the response may be cached for according to its Cache-Control header.
+def max_age(headers):
+    cache_control = headers.get("Cache-Control") or ""
+    if "no-cache" in cache_control or "no-store" in cache_control:
+        return 0
+    match = max_age_regexp.search(cache_control)
+    return int(match.group(1)) if match else 0
+
+
+# Returns the cached glossary, or None if the cache is missing, unreadable or of another version.
+def read_cache(path):
+    try:
+        with open(path, "r") as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+    return cache if cache.get("version") == CACHE_VERSION else None
+
+
+# Writes the cache file atomically, so the concurrent runs never read a partially written one.
+def write_cache(path, cache):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as cache_file:
+        json.dump(cache, cache_file)
+    os.replace(temp_path, path)
+
+
+# Writes the compiled keywords, so the highlighter can load them without fetching and parsing the glossary.
+@timed("write_compiled")
+def write_compiled(path, kwds):
+    keywords_regexp = compile_keywords(kwds)
+    with open(path, "w") as compiled_file:
+        json.dump({"version": COMPILED_VERSION, "terms": list(kwds),
+                   "pattern": keywords_regexp.pattern if keywords_regexp else None}, compiled_file)
+
+
+# Reads the compiled keywords.
+@timed("read_keywords")
+def read_compiled(path):
+    with open(path, "r") as compiled_file:
+        compiled = json.load(compiled_file)
+    if compiled.get("version") != COMPILED_VERSION:
+        raise AttributeError('The compiled glossary "%s" is of another version, it must be compiled again.' % path)
+
+    return re.compile(compiled["pattern"]) if compiled["pattern"] else None
 
-        if i != 0 and lines[i - 1].strip().startswith("Given"):
+
+# Compiles the keywords into a single regular expression, which matches the longest keyword starting at the leftmost
+# position. The keywords are merged into a trie first, so the expression follows a single branch per character instead
+# of trying every keyword in turn. Returns None for no keywords.
+@timed("compile_keywords")
+def compile_keywords(kwds):
+    trie = {}
+    for keyword in kwds:
+        if not keyword:
             continue
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[TRIE_END] = {}
+
+    return re.compile(trie_pattern(trie)) if trie else None
+
+
+# Returns the regular expression of the trie node. The optional suffixes are greedy, so the longest keyword wins.
+def trie_pattern(node):
+    branches = [re.escape(char) + trie_pattern(child) for char, child in sorted(node.items()) if char != TRIE_END]
+    if not branches:
+        return ""
+
+    pattern = branches[0] if len(branches) == 1 else "(?:%s)" % "|".join(branches)
+    return "(?:%s)?" % pattern if TRIE_END in node else pattern
+
+
+# Highlights the keywords in the input in a single pass, so the keywords within the highlighted ones are left intact.
+def highlight_keywords(text, kwds):
+    return highlight_matches(text, compile_keywords(kwds))
+
+
+# Highlights the matches of the compiled keywords in the input.
+def highlight_matches(text, keywords_regexp):
+    if not keywords_regexp:
+        return text
+
+    return keywords_regexp.sub(highlight(r"\g<0>", COLOURS['cyan']), text)
+
+
+# Inserts empty lines between scenarios, i.e. before every "When" step which does not follow a "Given" one.
+# Only the previous line is kept, so the lines are passed on as soon as they are read.
+def separate_scenarios(lines):
+    previous = None
+    for line in lines:
+        if line.strip().startswith("When") and previous is not None and not previous.strip().startswith("Given"):
+            yield "\n"
+        previous = line
+        yield line
+
+
+# Highlights the report read from the standard input with the glossary or the compiled one.
+def highlight_report(args):
+    if args.compiled:
+        keywords_regexp = read_compiled(args.compiled)
+    else:
+        context = ssl._create_unverified_context() if args.insecure else None
+        keywords = read_keywords(args.glossary, None if args.no_cache else args.cache_dir, args.timeout, args.retries,
+                                 context)
+        if args.save_compiled:
+            write_compiled(args.save_compiled, keywords)
+            return os.EX_OK
+        keywords_regexp = compile_keywords(keywords)
+
+    # The report is highlighted line by line while the tests are still running, e.g. in the CI logs.
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(line_buffering=True)
+    # The lines are too short to be timed one by one; the CPU time of the phase leaves out the waiting for the input.
+    with timings.phase("highlight"):
+        for report_line in separate_scenarios(sys.stdin):
+            sys.stdout.write(highlight_matches(report_line, keywords_regexp))
+
+    return os.EX_OK
+
+
+def main(argv=None):
+    parser = ArgumentParser()
+    parser.add_argument("glossary", nargs="?",
+                        help="A URL or a path to the Markdown file with the glossary table of the keywords")
+    parser.add_argument("--compiled", dest="compiled", help="A path to the compiled glossary to use instead")
+    parser.add_argument("--save-compiled", dest="save_compiled",
+                        help="Compiles the glossary to the path and exits without highlighting")
+    parser.add_argument("--cache-dir", dest="cache_dir", default=DEFAULT_CACHE_DIR,
+                        help="A directory to cache the downloaded glossaries in")
+    parser.add_argument("--no-cache", dest="no_cache", action="store_true", help="Disables the glossary cache")
+    parser.add_argument("--timeout", dest="timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="A timeout of the glossary download, s")
+    parser.add_argument("--retries", dest="retries", type=int, default=DEFAULT_RETRIES,
+                        help="A number of retries of the glossary download")
+    parser.add_argument("--insecure", dest="insecure", action="store_true",
+                        help="Disables the TLS certificate verification of the glossary download")
+    timings.add_arguments(parser)
+    args = parser.parse_args(argv)
 
-        lines[i] = "\n" + line
+    if not args.glossary and not args.compiled:
+        raise ValueError("either the glossary or the --compiled parameter must be set")
+    if args.save_compiled and not args.glossary:
+        raise ValueError("the --save-compiled parameter requires the glossary")
 
-    return "\n".join(lines)
+    with timings.recording(args.timings, args.profile):
+        return highlight_report(args)
 
 
-report = sys.stdin.read()
-report = separate_scenarios(report)
-if len(sys.argv) == 2:
-    TERMS_URL = sys.argv[1]
-highlighted_report = highlight_keywords(report, read_keywords(TERMS_URL))
-print(highlighted_report)
+if "__main__" == __name__:
+    sys.exit(main())
@@ -1,35 +1,60 @@
 #!/usr/bin/env python3
 
+import hashlib
+import json
 import os
 import re
 import subprocess
+import sys
+import tempfile
+import threading
+import time
 
 from argparse import ArgumentParser
-from prettytable import PrettyTable
-import yaml
-
-ATTR_PACKAGES = "packages"
-CONFIG = "config.yaml"
+from bisect import bisect_left
+from itertools import accumulate
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+# The shared toolkit package is next to the tool directories.
+PATH_UTILS = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if PATH_UTILS not in sys.path:
+    sys.path.insert(0, PATH_UTILS)
+from qa_toolkit import timings  # noqa: E402
+from qa_toolkit.core import Colour, lazy_import, require  # noqa: E402
+from qa_toolkit.timings import timed  # noqa: E402
 
-class Colour:
-    RED = "\033[91m"
-    GREEN = "\033[92m"
-    BLUE = "\033[94m"
-    # Resets the colour to the default one
-    RESET = "\x1b[0m"
-    # Dims the current colour
-    DIM = '\033[2m'
+prettytable = lazy_import("prettytable")
+yaml = lazy_import("yaml")
 
-    @staticmethod
-    # Highlights the text with a specified colour.
-    def highlight(text, colour):
-        return f'{colour}{text}{Colour.RESET}'
+ATTR_PACKAGES = "packages"
+CONFIG = "config.yaml"
+# The desired coverage of the changed lines, %.
+CHANGED_COVERAGE = 80
+DURATIONS_VERSION = 1
+CACHE_VERSION = 1
+PROFILE_MODE = "mode:"
+# The files of a package listed by go list, which its test binary is built from.
+PACKAGE_FILES = ("GoFiles", "CgoFiles", "CFiles", "CXXFiles", "HFiles", "SFiles", "SwigFiles", "SwigCXXFiles",
+                 "SysoFiles", "EmbedFiles")
+TEST_FILES = ("TestGoFiles", "XTestGoFiles", "TestEmbedFiles", "XTestEmbedFiles")
+TEST_IMPORTS = ("Imports", "TestImports", "XTestImports")
+# The counters variable of the go files instrumented by go tool cover to find their statements.
+COVER_VAR = "GoCoverStatements"
+# The go environment the tests are built and run with, e.g. the build tags are set by GOFLAGS.
+GO_ENV = ("GOVERSION", "GOOS", "GOARCH", "GOAMD64", "GOARM", "GOEXPERIMENT", "GOFLAGS", "CGO_ENABLED", "CC",
+          "CGO_CFLAGS", "CGO_CPPFLAGS", "CGO_LDFLAGS")
+
+json_whitespace_regexp = re.compile(r"\s*")
+# The lines of the concurrently tested packages are printed one at a time.
+output_lock = threading.Lock()
+hunk_regexp = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+cover_pos_regexp = re.compile(r"^\s*(\d+), (\d+), (0x[0-9a-f]+), // \[\d+\]$", flags=re.MULTILINE)
+cover_statements_regexp = re.compile(r"^\s*(\d+), // \d+$", flags=re.MULTILINE)
 
 
 # Validates the test coverage config file.
 def validate_coverage_config(config):
-    if ATTR_PACKAGES not in coverage_cfg:
+    if ATTR_PACKAGES not in config:
         raise AttributeError('The coverage config file is malformed. The "%s" attribute is missing.' % ATTR_PACKAGES)
 
     if len(config[ATTR_PACKAGES]) == 0:
@@ -50,41 +75,332 @@ def ensure_packages_exist(packages, repo_path):
             raise FileNotFoundError('Cannot find a package "%s" under "%s".' % (pkg, repo_path))
 
 
-def fetch_raw_coverage(packages, path):
-    if len(packages) == 0:
-        return ""
-
-    # Normalise the package path to be relative to the project.
-    packages = ["./%s" % p for p in packages]
+# Runs the unit tests of the packages concurrently, a go test process per package, and streams the output of every
+# package line by line prefixed with the package, e.g. "[pkg/api] ok ...". The slowest packages of the previous runs
+# are started first, so that no long package is left running alone at the end; the packages not timed yet are assumed
+# to be the slowest. Without verbose go test holds the output of a package back until its tests finish.
+# Returns the results of the packages by their names.
+@timed("run_tests")
+def run_tests(packages, path, module, jobs, durations=None, verbose=False):
+    durations = durations or {}
+    ordered = sorted(packages, key=lambda p: -durations.get(p, float("inf")))
+    results = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(test_package, package, path, module, verbose) for package in ordered]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result["package"]] = result
+
+    return results
+
+
+# Runs the unit tests of the package and returns its coverage, whether the tests failed, the output and the duration.
+# The output is printed as the tests write it. The coverage is read from the coverage profile of the tests rather than
+# from their output.
+def test_package(package, path, module, verbose=False):
+    started = time.perf_counter()
+    fd, profile_path = tempfile.mkstemp(suffix=".coverprofile")
+    os.close(fd)
+    output = []
     try:
-        raw_coverage = subprocess.check_output(['go', 'test', '-cover', *packages], cwd=os.path.realpath(path))
-        return raw_coverage.decode("UTF-8")
-    except Exception as e:
-        return str(e.output).replace('\\n', '\n').replace('\\t', '\t')
-
-
-def parse_coverage(raw_coverage):
-    failed_test_suites = re.findall(r"^FAIL\s*" + re.escape(args.module) + r"/([\w/]*)",
-                                    raw_coverage,
-                                    flags=re.MULTILINE)
-    if len(failed_test_suites) > 0:
-        raise AssertionError("Unit tests failed for packages: %s" % ", ".join(failed_test_suites))
-
-    res = {}
-    # Extracts all coverage percentages from the unit test report.
-    # https://regex101.com/r/xPIx8n/1
-    coverages = re.findall(
-        r"^ok\s*" + re.escape(args.module) + r"/([\w/]*)\s*(?:\(cached\)|\d*\.\d*s)?\s*coverage: (\d*\.\d*)%",
-        raw_coverage,
-        flags=re.MULTILINE)
-    for package, package_coverage in coverages:
-        res[package] = float(package_coverage)
-
-    return res
-
-
-def print_report(cfg, coverage):
-    table = PrettyTable(("Package", "Desired coverage", "Actual coverage"))
+        with timings.phase("go_test"):
+            command = ["go", "test", "-coverprofile=%s" % profile_path] + (["-v"] if verbose else [])
+            # Normalise the package path to be relative to the project.
+            process = subprocess.Popen(command + ["./%s" % package], cwd=os.path.realpath(path),
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            for raw_line in process.stdout:
+                line = raw_line.decode("UTF-8", errors="replace")
+                output.append(line)
+                with output_lock:
+                    print("[%s] %s" % (package, line), end="", flush=True)
+            process.wait()
+        with open(profile_path, "r") as profile_file:
+            blocks = parse_profile(profile_file)
+    finally:
+        os.remove(profile_path)
+
+    statements, covered = profile_totals(blocks, module).get(package, (0, 0))
+    return {"package": package, "coverage": coverage_percent(statements, covered), "statements": statements,
+            "covered": covered, "blocks": blocks, "failed": process.returncode != 0,
+            "output": "".join(output), "duration": time.perf_counter() - started}
+
+
+# Returns the number of the statements and whether they are covered by the blocks of the coverage profile. The profile
+# is read line by line, and a block listed several times (e.g. by several test binaries) is counted once, as covered if
+# it is covered in any of them.
+@timed("parse_profile")
+def parse_profile(lines):
+    blocks = {}
+    for line in lines:
+        if line.startswith(PROFILE_MODE) or line == "\n":
+            continue
+        block, statements, count = line.rsplit(" ", 2)
+        blocks[block] = (int(statements), blocks.get(block, (0, False))[1] or int(count) > 0)
+
+    return blocks
+
+
+# Returns the numbers of the statements and of the covered statements of the packages in the profile blocks by the
+# package paths relative to the module.
+def profile_totals(blocks, module):
+    prefix = module + "/"
+    packages = {}
+    for block, (statements, covered) in blocks.items():
+        package = os.path.dirname(block.rpartition(":")[0])
+        totals = packages.setdefault(package[len(prefix):] if package.startswith(prefix) else package, [0, 0])
+        totals[0] += statements
+        totals[1] += statements if covered else 0
+
+    return {package: tuple(totals) for package, totals in packages.items()}
+
+
+# Returns the percentage of the covered statements rounded the way go test reports it, or None with no statements.
+def coverage_percent(statements, covered):
+    return round(100 * covered / statements, 1) if statements else None
+
+
+# Lists the packages of the module with their files and imports by their import paths.
+@timed("go_list")
+def list_packages(path):
+    output = subprocess.check_output(["go", "list", "-e", "-json", "./..."], cwd=os.path.realpath(path))
+    output = output.decode("UTF-8")
+    decoder = json.JSONDecoder()
+    packages = {}
+    position = json_whitespace_regexp.match(output).end()
+    while position < len(output):
+        package, position = decoder.raw_decode(output, position)
+        packages[package["ImportPath"]] = package
+        position = json_whitespace_regexp.match(output, position).end()
+
+    return packages
+
+
+# Returns the cache keys of the packages: the hash of the go environment, of the go.mod and go.sum files, of every file
+# in the package directory (testdata and other files the tests may read included, the nested packages left out) and of
+# the files of every module package it depends on, its tests included. The external dependencies are pinned by go.sum,
+# so a key changes only when something the tests are built from or read changes.
+@timed("package_keys")
+def package_keys(packages, path, module):
+    listed = list_packages(path)
+    common = hashlib.sha256(subprocess.check_output(["go", "env"] + list(GO_ENV)))
+    for name in ("go.mod", "go.sum"):
+        if os.path.exists(os.path.join(path, name)):
+            with open(os.path.join(path, name), "rb") as module_file:
+                common.update(hashlib.sha256(module_file.read()).digest())
+
+    package_dirs = {p["Dir"] for p in listed.values() if p.get("Dir")}
+    file_hashes = {}
+    keys = {}
+    for package in packages:
+        import_path = "%s/%s" % (module, package)
+        if import_path not in listed:
+            continue
+
+        deps = {import_path}
+        stack = [i for attr in TEST_IMPORTS for i in listed[import_path].get(attr, ()) if i in listed]
+        while stack:
+            dep = stack.pop()
+            if dep not in deps:
+                deps.add(dep)
+                stack.extend(i for i in listed[dep].get("Imports", ()) if i in listed)
+
+        key = common.copy()
+        for dep in sorted(deps):
+            if dep == import_path:
+                names = directory_files(listed[dep]["Dir"], package_dirs)
+            else:
+                names = sorted({f for attr in PACKAGE_FILES for f in listed[dep].get(attr, ())})
+            for name in names:
+                file_path = os.path.join(listed[dep]["Dir"], name)
+                if file_path not in file_hashes:
+                    with open(file_path, "rb") as source_file:
+                        file_hashes[file_path] = hashlib.sha256(source_file.read()).hexdigest()
+                key.update(("%s/%s:%s\n" % (dep, name, file_hashes[file_path])).encode("UTF-8"))
+        keys[package] = key.hexdigest()
+
+    return keys
+
+
+# Returns the paths of the files under the package directory relative to it, sorted. The hidden directories and the
+# directories of the other packages, which have keys of their own, are left out.
+def directory_files(directory, package_dirs):
+    names = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".") and os.path.join(root, d) not in package_dirs)
+        names += [os.path.relpath(os.path.join(root, f), directory) for f in files]
+
+    return sorted(names)
+
+
+# Reads the cached coverage of the packages.
+def read_cache(path):
+    if not path or not os.path.exists(path):
+        return {}
+
+    with open(path, "r") as cache_file:
+        cache = json.load(cache_file)
+
+    return cache["packages"] if cache.get("version") == CACHE_VERSION else {}
+
+
+# Saves the coverage of the configured packages passing their tests, the cached ones included, with their cache keys.
+def write_cache(path, keys, results):
+    packages = {}
+    for package, result in results.items():
+        if not result["failed"] and package in keys:
+            packages[package] = {"key": keys[package], "statements": result["statements"],
+                                 "covered": result["covered"]}
+    with open(path, "w") as cache_file:
+        json.dump({"version": CACHE_VERSION, "packages": packages}, cache_file, indent=4, sort_keys=True)
+
+
+# Returns the result of the package taken from the cache.
+def cached_result(package, entry):
+    return {"package": package, "coverage": coverage_percent(entry["statements"], entry["covered"]),
+            "statements": entry["statements"], "covered": entry["covered"], "blocks": None, "failed": False,
+            "output": "", "duration": None}
+
+
+# Returns whether the go tool ignores the go file, i.e. it is in a "testdata" directory or one starting with "." or "_".
+def is_go_ignored(name):
+    return any(d == "testdata" or d.startswith((".", "_")) for d in name.split("/")[:-1])
+
+
+# Returns the line ranges of the go files changed since the merge base of the ref and HEAD, the uncommitted changes
+# included, by the file paths relative to the project. The test files and the ones the go tool ignores are left out.
+@timed("git_diff")
+def changed_lines(path, ref):
+    cwd = os.path.realpath(path)
+    base = subprocess.check_output(["git", "merge-base", ref, "HEAD"], cwd=cwd).decode("UTF-8").strip()
+    diff = subprocess.check_output(["git", "diff", "--unified=0", "--no-color", "--no-ext-diff", "--relative",
+                                    "--src-prefix=a/", "--dst-prefix=b/", base, "--", "*.go"], cwd=cwd)
+
+    changes = {}
+    ranges = None
+    previous = ""
+    for line in diff.decode("UTF-8", errors="replace").split("\n"):
+        if line.startswith("+++ ") and previous.startswith("--- "):
+            name = line[len("+++ b/"):]
+            is_skipped = line == "+++ /dev/null" or name.endswith("_test.go") or is_go_ignored(name)
+            ranges = None if is_skipped else changes.setdefault(name, [])
+        elif line.startswith("@@") and ranges is not None:
+            match = hunk_regexp.match(line)
+            first = int(match.group(1))
+            count = 1 if match.group(2) is None else int(match.group(2))
+            if count > 0:
+                ranges.append((first, first + count - 1))
+        previous = line
+
+    return changes
+
+
+# The coverage blocks of a go file ordered by their first lines. The blocks overlapping a line range are found with a
+# binary search over the running maximum of their last lines, which is sorted however the blocks overlap.
+class BlockIndex:
+    def __init__(self, blocks):
+        self.blocks = sorted(blocks)
+        self.max_ends = list(accumulate((block[1] for block in self.blocks), max))
+
+    # Returns the blocks overlapping the lines from first to last.
+    def overlapping(self, first, last):
+        blocks = []
+        for i in range(bisect_left(self.max_ends, first), len(self.blocks)):
+            block = self.blocks[i]
+            if block[0] > last:
+                break
+            if block[1] >= first:
+                blocks.append(block)
+
+        return blocks
+
+
+# Returns the block indexes of the go files in the profile blocks by the file paths relative to the module.
+@timed("index_blocks")
+def index_blocks(blocks, module):
+    prefix = module + "/"
+    files = {}
+    for block, (statements, covered) in blocks.items():
+        name, _, span = block.rpartition(":")
+        start, end = span.split(",")
+        name = name[len(prefix):] if name.startswith(prefix) else name
+        files.setdefault(name, []).append((int(start.partition(".")[0]), int(end.partition(".")[0]), statements,
+                                           covered))
+
+    return {name: BlockIndex(file_blocks) for name, file_blocks in files.items()}
+
+
+# Returns the blocks of the statements of the go files, none of them covered, by the file paths. They are the blocks go
+# test would report for a package without tests, which it leaves out of the profile: the files are instrumented by go
+# tool cover, and its counters hold the lines, the columns and the numbers of statements of the blocks. The files it
+# cannot instrument are left out.
+@timed("cover_files")
+def statement_blocks(path, module, names):
+    files = {}
+    for name in names:
+        process = subprocess.run(["go", "tool", "cover", "-mode=set", "-var=%s" % COVER_VAR, name],
+                                 cwd=os.path.realpath(path), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if process.returncode != 0:
+            continue
+        instrumented = process.stdout.decode("UTF-8", errors="replace")
+        counters = instrumented[instrumented.rfind("\nvar %s = struct {" % COVER_VAR):]
+        blocks = {}
+        for (start, end, columns), statements in zip(cover_pos_regexp.findall(counters),
+                                                     cover_statements_regexp.findall(counters)):
+            columns = int(columns, 16)
+            block = "%s/%s:%s.%d,%s.%d" % (module, name, start, columns & 0xFFFF, end, columns >> 16)
+            blocks[block] = (int(statements), False)
+        files[name] = blocks
+
+    return files
+
+
+# Returns whether the changed lines with statements are covered. A line is covered only if every block on it is.
+def changed_lines_coverage(index, ranges):
+    lines = {}
+    for first, last in ranges:
+        for start, end, statements, covered in index.overlapping(first, last):
+            if statements == 0:
+                continue
+            for line in range(max(start, first), min(end, last) + 1):
+                lines[line] = lines.get(line, True) and covered
+
+    return lines
+
+
+# Formats the line numbers as ranges, e.g. "3-5, 9".
+def format_lines(lines):
+    ranges = []
+    for line in sorted(lines):
+        if ranges and ranges[-1][1] == line - 1:
+            ranges[-1][1] = line
+        else:
+            ranges.append([line, line])
+
+    return ", ".join(str(first) if first == last else "%d-%d" % (first, last) for first, last in ranges)
+
+
+# Reads the test durations of the packages in the previous runs.
+def read_durations(path):
+    if not path or not os.path.exists(path):
+        return {}
+
+    with open(path, "r") as durations_file:
+        durations = json.load(durations_file)
+
+    return durations["packages"] if durations.get("version") == DURATIONS_VERSION else {}
+
+
+# Saves the test durations of the packages along with the ones of the packages not tested this time.
+def write_durations(path, durations, results):
+    durations = dict(durations)
+    durations.update({package: round(result["duration"], 3) for package, result in results.items()})
+    with open(path, "w") as durations_file:
+        json.dump({"version": DURATIONS_VERSION, "packages": durations}, durations_file, indent=4, sort_keys=True)
+
+
+@timed("report")
+def print_report(cfg, coverage, durations):
+    table = prettytable.PrettyTable(("Package", "Desired coverage", "Actual coverage", "Test time, s"))
     is_undertested = False
     for package, desired_coverage in cfg[ATTR_PACKAGES].items():
         if package not in coverage:
@@ -98,11 +414,53 @@ def print_report(cfg, coverage):
             package,
             Colour.highlight(desired_coverage, colour),
             Colour.highlight(actual_coverage, colour),
+            "cached" if durations[package] is None else "%.1f" % durations[package],
         ))
 
     table.align["Package"] = "l"
     table.align["Desired coverage"] = "r"
     table.align["Actual coverage"] = "r"
+    table.align["Test time, s"] = "r"
+    print(table)
+
+    return is_undertested
+
+
+# Prints the coverage of the changed lines of the tested go files and returns whether it is below the desired one.
+# The changed files without any coverage data, i.e. the ones go tool cover cannot instrument, are listed as such and
+# fail the gate.
+@timed("report")
+def print_changed_report(changes, indexes, desired_coverage, unprofiled=()):
+    table = prettytable.PrettyTable(("File", "Changed lines", "Covered lines", "Coverage", "Uncovered lines"))
+    total_lines = total_covered = 0
+    unprofiled = [name for name in unprofiled if changes.get(name)]
+    for name, ranges in sorted(changes.items()):
+        if name in unprofiled:
+            table.add_row((name, sum(last - first + 1 for first, last in ranges), "", "no coverage data",
+                           format_lines(line for first, last in ranges for line in range(first, last + 1))))
+            continue
+        lines = changed_lines_coverage(indexes[name], ranges) if name in indexes else {}
+        if not lines:
+            continue
+        covered = sum(1 for is_covered in lines.values() if is_covered)
+        total_lines += len(lines)
+        total_covered += covered
+        table.add_row((name, len(lines), covered, coverage_percent(len(lines), covered),
+                       format_lines(line for line, is_covered in lines.items() if not is_covered)))
+
+    coverage = coverage_percent(total_lines, total_covered)
+    if coverage is None and not unprofiled:
+        print("No changed lines with statements in the tested packages.")
+        return False
+
+    is_undertested = bool(unprofiled) or coverage is not None and coverage < desired_coverage
+    colour = Colour.RED if is_undertested else Colour.GREEN
+    table.add_row(("Total (desired %g)" % desired_coverage, total_lines, total_covered,
+                   "" if coverage is None else Colour.highlight(coverage, colour), ""))
+    table.align["File"] = "l"
+    table.align["Uncovered lines"] = "l"
+    for column in ("Changed lines", "Covered lines", "Coverage"):
+        table.align[column] = "r"
     print(table)
 
     return is_undertested
@@ -110,46 +468,100 @@ def print_report(cfg, coverage):
 
 # Validates and normalises the CLI arguments.
 def normalise(args):
-    if not args.repo_path:
-        raise "the --repo parameter must be point to the Go project source code"
-
-    if not args.module:
-        raise "the --module parameter contain a fully qualified module name"
+    require(args.repo_path, "repo")
+    require(args.module, "module")
 
     if not args.config:
         args.config = CONFIG
 
+    if args.jobs < 1:
+        raise ValueError("the --jobs parameter must be an integer value greater that 0")
+
     return args
 
 
-if "__main__" == __name__:
+def main(argv=None):
     parser = ArgumentParser()
     parser.add_argument("-r", "--repo", dest="repo_path", help="A path to the Go project source code")
     parser.add_argument("-m", "--module", dest="module", help="A Go module name")
     parser.add_argument("-c", "--config", dest="config", help="A coverage file config")
-
-    args = parser.parse_args()
+    parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=os.cpu_count(),
+                        help="A number of packages tested concurrently")
+    parser.add_argument("--durations", dest="durations",
+                        help="A path to the test durations of the packages; the slowest ones are tested first")
+    parser.add_argument("--cache", dest="cache",
+                        help="A path to the coverage cache; only the packages changed since it was saved are tested")
+    parser.add_argument("--base-ref", dest="base_ref",
+                        help="A git ref to gate the coverage of the lines changed since on")
+    parser.add_argument("--changed-coverage", dest="changed_coverage", type=float, default=CHANGED_COVERAGE,
+                        help="The desired coverage of the changed lines, %%")
+    parser.add_argument("-v", "--verbose", dest="verbose", action="store_true",
+                        help="Runs go test -v, so the output of the tests is streamed as they run")
+    timings.add_arguments(parser)
+
+    args = parser.parse_args(argv)
     normalise(args)
 
-    try:
-        with open(os.path.join(args.repo_path, args.config), 'r') as config_file:
-            coverage_cfg = yaml.safe_load(config_file)
-
-        validate_coverage_config(coverage_cfg)
-
-        # Validate the coverage prerequisites.
-        packages_with_coverage = list(coverage_cfg[ATTR_PACKAGES].keys())
-        ensure_packages_exist(packages_with_coverage, args.repo_path)
+    with timings.recording(args.timings, args.profile):
+        try:
+            with open(os.path.join(args.repo_path, args.config), 'r') as config_file:
+                coverage_cfg = yaml.safe_load(config_file)
+
+            validate_coverage_config(coverage_cfg)
+
+            # Validate the coverage prerequisites.
+            packages_with_coverage = list(coverage_cfg[ATTR_PACKAGES].keys())
+            ensure_packages_exist(packages_with_coverage, args.repo_path)
+
+            # Calculate the coverage.
+            durations = read_durations(args.durations)
+            cache = read_cache(args.cache)
+            keys = package_keys(packages_with_coverage, args.repo_path, args.module) if args.cache else {}
+            # The packages with changed files are tested anyway, the cache has no coverage of their lines. The ones
+            # missing in the config are tested too, so the changed lines are gated wherever they are.
+            changes = changed_lines(args.repo_path, args.base_ref) if args.base_ref else {}
+            changed_packages = {os.path.dirname(name) for name in changes}
+            cached = [p for p in packages_with_coverage if p in keys and cache.get(p, {}).get("key") == keys[p]
+                      and p not in changed_packages]
+            unconfigured = sorted(changed_packages - set(packages_with_coverage))
+            tested = [p for p in packages_with_coverage if p not in cached] + unconfigured
+            results = run_tests(tested, args.repo_path, args.module, args.jobs, durations, args.verbose)
+            if args.durations:
+                write_durations(args.durations, durations, results)
+            results.update({p: cached_result(p, cache[p]) for p in cached})
+            if args.cache:
+                write_cache(args.cache, keys, results)
+
+            failed_test_suites = [p for p in packages_with_coverage + unconfigured if results[p]["failed"]]
+            if len(failed_test_suites) > 0:
+                raise AssertionError("Unit tests failed for packages: %s" % ", ".join(failed_test_suites))
+
+            base_coverage = {p: r["coverage"] for p, r in results.items() if r["coverage"] is not None}
+            is_undertested = print_report(coverage_cfg, base_coverage, {p: r["duration"] for p, r in results.items()})
+            if args.base_ref:
+                blocks = {}
+                for result in results.values():
+                    blocks.update(result["blocks"] or {})
+                indexes = index_blocks(blocks, args.module)
+                # The changed files of the packages without coverage blocks, e.g. without tests, get the blocks of their
+                # statements, so only their changed lines with statements count as uncovered.
+                profiled_packages = {os.path.dirname(name) for name in indexes}
+                untested = [name for name in changes if os.path.dirname(name) not in profiled_packages]
+                instrumented = statement_blocks(args.repo_path, args.module, untested)
+                for file_blocks in instrumented.values():
+                    indexes.update(index_blocks(file_blocks, args.module))
+                unprofiled = set(untested) - set(instrumented)
+                is_undertested = print_changed_report(changes, indexes, args.changed_coverage,
+                                                      unprofiled) or is_undertested
+            if is_undertested:
+                return os.EX_DATAERR
+
+        except (AttributeError, AssertionError, FileNotFoundError) as e:
+            print(e)
+            return os.EX_IOERR
+
+        return os.EX_OK
 
-        # Calculate the coverage.
-        raw_coverage = fetch_raw_coverage(packages_with_coverage, args.repo_path)
-        print(raw_coverage)
-        base_coverage = parse_coverage(raw_coverage)
 
-        is_undertested = print_report(coverage_cfg, base_coverage)
-        if is_undertested:
-            exit(os.EX_DATAERR)
-
-    except (AttributeError, AssertionError, FileNotFoundError) as e:
-        print(e)
-        exit(os.EX_IOERR)
+if "__main__" == __name__:
+    sys.exit(main())